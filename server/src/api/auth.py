@@ -7,7 +7,7 @@ from sqlalchemy.orm import Session
 
 from schemas import schemas
 from core.auth import (
-    get_password_hash, verify_password, create_access_token,
+    ahash_password, averify_and_update_password, create_access_token,
     get_current_active_user, add_token_to_blacklist, oauth2_scheme,
     verify_google_token
 )
@@ -35,7 +35,11 @@ async def login_for_access_token(
     user = db.query(User).filter(User.email == form_data.username).first()
 
     # Check if user exists and password is correct
-    if not user or not user.hashed_password or not verify_password(form_data.password, user.hashed_password):
+    password_ok, new_hash = False, None
+    if user and user.hashed_password:
+        password_ok, new_hash = await averify_and_update_password(
+            form_data.password, user.hashed_password)
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -50,6 +54,11 @@ async def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Upgrade hashes made with a deprecated scheme (bcrypt) to argon2id
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
+
     # Create access token
     access_token_expires = timedelta(
         minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -90,7 +99,7 @@ async def signup(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
         email=user_data.email,
         full_name=user_data.full_name,
         profile_picture=user_data.profile_picture,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await ahash_password(user_data.password),
         is_admin=user_data.is_admin
     )
 
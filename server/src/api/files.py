@@ -1,28 +1,29 @@
 import os
+import logging
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File as FastAPIFile, Form
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-import magic
-import traceback
+from sqlalchemy import func
 
 from schemas import schemas
 from core.auth import get_current_active_user
+from core.config import settings
 from core.database import get_db
 from models.models import User, Session as SessionModel, File, FileContent
-from utils.s3 import upload_file_to_s3, get_file_from_s3, delete_file_from_s3, generate_presigned_url,download_file_from_s3
-from utils.file_parsers import parse_file_content
+from utils.s3 import upload_file_to_s3, delete_file_from_s3, generate_presigned_url,download_file_from_s3
+from utils.file_parsers import parse_file_content, detect_mime_type
 from utils.logger import logger
 
 router = APIRouter(prefix="/files", tags=["files"])
 
-# List of supported MIME types
-SUPPORTED_MIME_TYPES = [
+# Set of supported MIME types (frozenset for O(1) membership checks)
+SUPPORTED_MIME_TYPES = frozenset({
     "text/plain",  # TXT
     "text/csv",    # CSV
     "application/csv",  # Alternative CSV
     "application/pdf",  # PDF
-]
+})
 
 # Map MIME types to file types for storage
 MIME_TYPE_TO_FILE_TYPE = {
@@ -32,6 +33,47 @@ MIME_TYPE_TO_FILE_TYPE = {
     "application/pdf": "pdf",
 }
 
+# Uploads are read in chunks of this size so oversized files are rejected early
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024
+
+
+async def read_upload(file: UploadFile, max_bytes: int = None) -> bytes:
+    """
+    Read an uploaded file into memory, enforcing a maximum size.
+
+    The file is read in chunks and rejected as soon as it grows past the
+    limit, so an oversized upload is never fully loaded.
+
+    Args:
+        file: The uploaded file
+        max_bytes: Maximum accepted size; defaults to settings.MAX_UPLOAD_BYTES
+
+    Returns:
+        bytes: The file content
+
+    Raises:
+        HTTPException: If the file is larger than max_bytes
+    """
+    if max_bytes is None:
+        max_bytes = settings.MAX_UPLOAD_BYTES
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File is too large. The maximum size is {max_bytes // (1024 * 1024)} MB."
+    )
+
+    # Starlette records the size of the spooled upload, when known
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+
+    chunks = []
+    total = 0
+    while chunk := await file.read(UPLOAD_READ_CHUNK_SIZE):
+        total += len(chunk)
+        if total > max_bytes:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
 
 @router.post("", response_model=schemas.FileResponse)
 async def upload_file(
@@ -73,13 +115,10 @@ async def upload_file(
                 detail="Session not found"
             )
 
-        # Read a small portion of the file to determine its MIME type
-        logger.debug(f"Reading file header: {file.filename}")
-        file_header = await file.read(2048)
-        mime_type = magic.from_buffer(file_header, mime=True)
-
-        # Reset file position after reading the header
-        await file.seek(0)
+        # Read the file once; the MIME type is detected from its first bytes
+        logger.debug(f"Reading file: {file.filename}")
+        content = await read_upload(file)
+        mime_type = detect_mime_type(content[:2048], file.filename)
         logger.debug(f"File MIME type: {mime_type}")
 
         # Check if file type is supported
@@ -91,14 +130,9 @@ async def upload_file(
             )
 
         # Get file size
-        file_size = 0
-        content = await file.read()
         file_size = len(content)
         logger.debug(f"File size: {file_size} bytes")
 
-        # Reset file position
-        await file.seek(0)
-
         # Map MIME type to file type
         file_type = MIME_TYPE_TO_FILE_TYPE.get(mime_type, "txt")
 
@@ -108,97 +142,53 @@ async def upload_file(
             s3_key = await upload_file_to_s3(content, session_id, file.filename)
             logger.info(f"File uploaded to S3, key: {s3_key}")
         except Exception as e:
-            logger.error(f"S3 upload failed: {str(e)}")
-            logger.error(traceback.format_exc())
+            logger.exception(f"S3 upload failed: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"File storage error: {str(e)}"
             )
 
-        # Create file record in database
+        # Parse the content already in memory rather than downloading the
+        # object just uploaded back from S3
+        try:
+            logger.debug(f"Parsing file content, type: {file_type}")
+            parsed_content = parse_file_content(content, file_type)
+            logger.debug(
+                f"Parsed content length: {len(parsed_content) if parsed_content else 0}")
+        except Exception as e:
+            # Log the error but don't fail the upload; store the error
+            # message as the content instead
+            logger.exception(f"Error parsing file content: {str(e)}")
+            parsed_content = f"Error parsing file: {str(e)}"
+
+        # Create the file record and its content in a single transaction so
+        # the upload checks a pooled connection out only once
         logger.debug(f"Creating file record in database")
         new_file = File(
             session_id=session_id,
             filename=file.filename,
             file_type=file_type,
             s3_key=s3_key,
-            file_size=file_size
+            file_size=file_size,
+            contents=FileContent(content=parsed_content)
         )
 
         db.add(new_file)
         db.commit()
         db.refresh(new_file)
-        logger.info(f"File record created, ID: {new_file.id}")
-
-        # Parse file content and store it
-        try:
-            # Get file from S3 since we've already uploaded it
-            logger.debug(f"Retrieving file content from S3 with key: {s3_key}")
-            file_content_bytes = await get_file_from_s3(s3_key)
-
-            if not file_content_bytes:
-                logger.error(
-                    f"Failed to retrieve file content from S3 for key: {s3_key}")
-                # Use the content we already have in memory
-                logger.info(
-                    f"Using cached file content, size: {len(content)} bytes")
-                file_content_bytes = content
-
-            # Parse the content based on file type
-            logger.debug(f"Parsing file content, type: {file_type}")
-            parsed_content = parse_file_content(file_content_bytes, file_type)
-            logger.debug(
-                f"Parsed content length: {len(parsed_content) if parsed_content else 0}")
-
-            # Store the content in the database
-            logger.debug(
-                f"Storing file content in database for file_id: {new_file.id}")
-            file_content = FileContent(
-                file_id=new_file.id,
-                content=parsed_content
-            )
-
-            db.add(file_content)
-            db.commit()
-            logger.info(f"File content stored successfully")
-
-            # Verify file content was saved
-            content_check = db.query(FileContent).filter(
-                FileContent.file_id == new_file.id).first()
-            if content_check:
-                logger.info(
-                    f"Verified file content was saved with length: {len(content_check.content)}")
-
-                # Also verify that relationship works correctly
-                file_with_content = db.query(File).filter(
-                    File.id == new_file.id).first()
-                if file_with_content and file_with_content.contents:
-                    logger.info(
-                        f"File-to-content relationship verified: {file_with_content.id} -> {file_with_content.contents.id}")
-                else:
-                    logger.warning(
-                        f"File-to-content relationship not working for file_id: {new_file.id}")
+        logger.info(f"File record and content stored, ID: {new_file.id}")
+
+        # Verify file content was saved. Diagnostic only, so it is skipped
+        # unless debug logging is on and fetches just the stored length.
+        if logger.isEnabledFor(logging.DEBUG):
+            saved_length = db.query(func.length(FileContent.content)).filter(
+                FileContent.file_id == new_file.id).scalar()
+            if saved_length is not None:
+                logger.debug(
+                    f"Verified file content was saved with length: {saved_length}")
             else:
                 logger.warning(
                     f"Failed to verify file content was saved for file_id: {new_file.id}")
-        except Exception as e:
-            # Log the error but don't fail the upload
-            logger.error(f"Error parsing file content: {str(e)}")
-            logger.error(traceback.format_exc())
-
-            # Try to store at least something
-            try:
-                # Store error message in the content
-                error_message = f"Error parsing file: {str(e)}"
-                file_content = FileContent(
-                    file_id=new_file.id,
-                    content=error_message
-                )
-                db.add(file_content)
-                db.commit()
-                logger.info(f"Stored error message as file content")
-            except Exception as inner_e:
-                logger.error(f"Failed to store error message: {str(inner_e)}")
 
         return new_file
 
@@ -206,8 +196,7 @@ async def upload_file(
         # Re-raise HTTP exceptions as is
         raise
     except Exception as e:
-        logger.error(f"Unexpected error in upload_file: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Unexpected error in upload_file: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error uploading file: {str(e)}"
@@ -12,6 +12,7 @@ from datetime import datetime
 
 from utils.sessions import markdown_to_reportlab_paragraphs, generate_chart_from_data, create_reportlab_image
 from utils.logger import logger
+from utils.session_owners import forget_session_owner
 
 from schemas import schemas
 from core.auth import get_current_active_user
@@ -29,6 +30,33 @@ from reportlab.lib.units import inch
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
 
+def _load_export_messages(db: Session, session_id: int):
+    """
+    Load the messages of a session for export, oldest first.
+
+    Only the columns used by the exports are selected, so rows come back as
+    plain tuples instead of tracked Question objects.
+
+    Args:
+        db: Database session
+        session_id: ID of the session to export
+
+    Returns:
+        List of rows with question_text, answer_text, chart_data,
+        chart_type, created_at and answered_at attributes
+    """
+    return db.query(Question).with_entities(
+        Question.question_text,
+        Question.answer_text,
+        Question.chart_data,
+        Question.chart_type,
+        Question.created_at,
+        Question.answered_at
+    ).filter(
+        Question.session_id == session_id
+    ).order_by(Question.id.asc()).all()
+
+
 @router.post("", response_model=schemas.SessionResponse)
 async def create_session(
     session_create: schemas.SessionCreate,
@@ -184,6 +212,7 @@ async def delete_session(
         # Delete session (cascade will delete associated files, insights, and questions)
         db.delete(session)
         db.commit()
+        forget_session_owner(session_id)
 
         return None
     except Exception as e:
@@ -292,7 +321,7 @@ async def list_session_questions(
 
     # Get questions for session
     questions = db.query(Question).filter(
-        Question.session_id == session_id).order_by(Question.created_at.desc()).all()
+        Question.session_id == session_id).order_by(Question.id.desc()).all()
 
     return questions
 
@@ -479,7 +508,7 @@ async def list_session_messages(
     # Get questions and answers for session
     messages = db.query(Question).filter(
         Question.session_id == session_id
-    ).order_by(Question.created_at.asc()).offset(skip).limit(limit).all()
+    ).order_by(Question.id.asc()).offset(skip).limit(limit).all()
 
     # Format the messages as question-answer pairs
     return messages
@@ -510,9 +539,7 @@ async def export_session_to_csv(
         )
 
     # Get messages for session
-    messages = db.query(Question).filter(
-        Question.session_id == session_id
-    ).order_by(Question.created_at.asc()).all()
+    messages = _load_export_messages(db, session_id)
 
     # Convert to pandas DataFrame
     data = []
@@ -584,9 +611,7 @@ async def export_session_to_markdown(
         )
 
     # Get messages for session
-    messages = db.query(Question).filter(
-        Question.session_id == session_id
-    ).order_by(Question.created_at.asc()).all()
+    messages = _load_export_messages(db, session_id)
 
     # Create markdown content
     md_content = f"# Session: {session.name}\n\n"
@@ -648,9 +673,7 @@ async def export_session_to_pdf(
         )
 
     # Get messages for session
-    messages = db.query(Question).filter(
-        Question.session_id == session_id
-    ).order_by(Question.created_at.asc()).all()
+    messages = _load_export_messages(db, session_id)
 
     # Create a buffer for the PDF
     buffer = io.BytesIO()
@@ -1,31 +1,997 @@
-from typing import List, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, File, Form
-from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Awaitable, Callable, Optional, Set, Tuple, AsyncGenerator, AsyncIterator, TypeVar
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Request, UploadFile, File, Form
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from sqlalchemy.orm import Session
-import sys
-import traceback
-from pydantic import ValidationError
+from sqlalchemy import func
+from openai import RateLimitError
 import asyncio
-import io
-import tempfile
-import os
-import json
+import functools
 import logging
-import datetime
-from datetime import timezone
-import magic
+import orjson
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 from schemas import schemas
 from core.auth import get_current_active_user
-from core.database import get_db
+from core.database import get_db, SessionFactory, db_write_lock
 from models.models import User, Session as SessionModel, File, FileContent, Insight, Question
-from utils.text_analyzer import analyze_text, answer_question, answer_question_stream,visualize_text
+from utils.text_analyzer import analyze_text, answer_question, answer_question_stream,visualize_text, QA_CONTEXT_MAX_CHARS, QA_STREAM_ERROR_MESSAGE, ANALYSIS_MAX_CHARS, ANALYSIS_ERROR_MESSAGE, PASTED_TEXT_MIN_CHARS, extract_question_and_context, overall_sentiment, dominant_emotion
 from utils.logger import logger
 from core.config import settings
 from utils.s3 import upload_file_to_s3
-from api.files import parse_file_content, SUPPORTED_MIME_TYPES, MIME_TYPE_TO_FILE_TYPE
+from utils.semantic_cache import SemanticAnswerCache, content_fingerprint
+from utils.chunk_index import ChunkIndex, build_chunk_index
+from utils.analysis_cache import AnalysisCache
+from utils.analysis_store import AnalysisStore
+from utils.session_owners import user_owns_session
+from api.files import read_upload, SUPPORTED_MIME_TYPES, MIME_TYPE_TO_FILE_TYPE
+from utils.file_parsers import parse_file_content, detect_mime_type
+
+router = APIRouter(prefix="/analysis", tags=["analysis"],
+                   default_response_class=ORJSONResponse)
+
+# Short-lived cache of joined file contents per session, keyed by
+# (session_id, context_version) so new uploads invalidate it automatically
+CONTEXT_CACHE_TTL_SECONDS = 60
+CONTEXT_CACHE_MAX_SIZE = 512
+_context_cache: Dict[Tuple[int, Any], Tuple[float, str]] = {}
+
+
+def _get_cached_context(key: Tuple[int, Any]) -> Optional[str]:
+    """Return a cached context string if present and not expired."""
+    entry = _context_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, context = entry
+    if expires_at < time.monotonic():
+        _context_cache.pop(key, None)
+        return None
+    return context
+
+
+def _set_cached_context(key: Tuple[int, Any], context: str) -> None:
+    """Store a context string, evicting the oldest entry when the cache is full."""
+    if len(_context_cache) >= CONTEXT_CACHE_MAX_SIZE:
+        _context_cache.pop(next(iter(_context_cache)), None)
+    _context_cache[key] = (time.monotonic() + CONTEXT_CACHE_TTL_SECONDS, context)
+
+
+# Parsed text of recently uploaded files, keyed by (file type, fingerprint of
+# the raw bytes), so re-uploading the same file in a session skips parsing
+PARSED_CONTENT_CACHE_MAX_SIZE = 128
+_parsed_content_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+
+async def _parse_file_content_cached(content: bytes, file_type: str, content_hash: str) -> str:
+    """
+    Parse uploaded file content, reusing the result for identical uploads.
+
+    Args:
+        content: Raw file bytes
+        file_type: Stored file type (txt, csv, pdf)
+        content_hash: Fingerprint of the raw bytes
+
+    Returns:
+        str: The parsed text content
+    """
+    key = (file_type, content_hash)
+    parsed_content = _parsed_content_cache.get(key)
+    if parsed_content is not None:
+        _parsed_content_cache.move_to_end(key)
+        logger.debug("Using cached parsed content for %s", content_hash[:12])
+        return parsed_content
+
+    parsed_content = await asyncio.to_thread(parse_file_content, content, file_type)
+    _parsed_content_cache[key] = parsed_content
+    if len(_parsed_content_cache) > PARSED_CONTENT_CACHE_MAX_SIZE:
+        _parsed_content_cache.popitem(last=False)
+    return parsed_content
+
+
+# Chunk indexes for uploaded documents too long to send whole, keyed by
+# fingerprint of the raw bytes. Built once at upload so follow-up questions
+# only need a similarity search.
+CHUNK_INDEX_CACHE_MAX_SIZE = 128
+RETRIEVED_CHUNK_COUNT = 6
+_chunk_index_cache: "OrderedDict[str, ChunkIndex]" = OrderedDict()
+
+
+async def _get_chunk_index(parsed_content: str, content_hash: str) -> Optional[ChunkIndex]:
+    """
+    Get the chunk index for a long document, building it on first use.
+
+    Args:
+        parsed_content: The parsed text content
+        content_hash: Fingerprint of the raw file bytes
+
+    Returns:
+        The chunk index, or None if the document fits in the context window
+        or the index could not be built
+    """
+    if len(parsed_content) <= QA_CONTEXT_MAX_CHARS:
+        return None
+
+    chunk_index = _chunk_index_cache.get(content_hash)
+    if chunk_index is not None:
+        _chunk_index_cache.move_to_end(content_hash)
+        return chunk_index
+
+    try:
+        chunk_index = await asyncio.to_thread(build_chunk_index, parsed_content)
+    except Exception as e:
+        logger.warning(f"Failed to build chunk index: {str(e)}")
+        return None
+
+    _chunk_index_cache[content_hash] = chunk_index
+    if len(_chunk_index_cache) > CHUNK_INDEX_CACHE_MAX_SIZE:
+        _chunk_index_cache.popitem(last=False)
+    return chunk_index
+
+
+def _select_context(
+    parsed_content: str,
+    chunk_index: Optional[ChunkIndex],
+    question_embedding: Optional[Any]
+) -> str:
+    """
+    Pick the context to send with a question about an uploaded file.
+
+    Args:
+        parsed_content: The full parsed text content
+        chunk_index: Chunk index for long documents, if one was built
+        question_embedding: Normalized question embedding, if available
+
+    Returns:
+        str: The most relevant chunks for long documents, otherwise the full content
+    """
+    if chunk_index is None or question_embedding is None:
+        return parsed_content
+    return "\n\n".join(chunk_index.search(question_embedding, RETRIEVED_CHUNK_COUNT))
+
+
+def _get_owned_file(db: Session, file_id: int, user_id: int) -> Optional[File]:
+    """
+    Get a file if it belongs to one of a user's sessions.
+
+    The file is loaded by primary key and ownership is checked against the
+    cached session owner, so no join with the sessions table is needed.
+
+    Args:
+        db: Database session
+        file_id: ID of the file
+        user_id: ID of the user who must own the file's session
+
+    Returns:
+        The file, or None if it does not exist or is not owned by the user
+    """
+    file = db.get(File, file_id)
+    if file is None or not user_owns_session(db, file.session_id, user_id):
+        return None
+    return file
+
+
+def _load_session_file_texts(db: Session, session_id: int) -> List[str]:
+    """
+    Load the parsed text of every file in a session in a single query.
+
+    Only the content column is selected, so no FileContent objects are
+    built or tracked by the session.
+
+    Args:
+        db: Database session
+        session_id: ID of the session whose file contents should be loaded
+
+    Returns:
+        List of parsed file texts for the session
+    """
+    file_texts = [
+        content for (content,) in db.query(FileContent.content).join(File).filter(
+            File.session_id == session_id
+        )
+    ]
+
+    logger.debug(
+        "File content query: session_id=%s, found %d files", session_id, len(file_texts))
+
+    return file_texts
+
+
+# Character caps on each historical turn, so long pasted questions and
+# chart-data answers are neither fetched nor tokenized in full before the
+# history is trimmed to its token budget
+HISTORY_QUESTION_MAX_CHARS = 500
+HISTORY_ANSWER_MAX_CHARS = 2000
+
+
+def _load_owned_session_history(
+    db: Session,
+    session_id: int,
+    user_id: int,
+    history_limit: int,
+    include_charts: bool = False
+) -> Optional[List[Tuple[str, str]]]:
+    """
+    Verify session ownership and load its recent history in one query.
+
+    The most recent answered questions are selected newest first in a
+    subquery, then outer joined onto the owned session and re-sorted oldest
+    first. A missing session yields no rows, while a session without
+    history (such as on the first question) yields a single row of NULL
+    question columns, so the first turn costs no extra round trip.
+
+    Args:
+        db: Database session
+        session_id: ID of the session
+        user_id: ID of the user who must own the session
+        history_limit: Number of previous Q&A pairs to include
+        include_charts: Whether to append chart data to historical answers
+
+    Returns:
+        List of (question, answer) tuples, oldest first, or None if the
+        session does not exist or is not owned by the user
+    """
+    # Nothing to join when no history is wanted; just check ownership
+    if history_limit <= 0:
+        return [] if user_owns_session(db, session_id, user_id) else None
+
+    # IDs are monotonic, so ordering by id matches creation order and uses
+    # the (session_id, id DESC) index instead of sorting by timestamp
+    recent_questions = db.query(
+        Question.id,
+        Question.session_id,
+        func.substr(Question.question_text, 1,
+                    HISTORY_QUESTION_MAX_CHARS).label("question_text"),
+        func.substr(Question.answer_text, 1,
+                    HISTORY_ANSWER_MAX_CHARS).label("answer_text"),
+        Question.chart_data
+    ).filter(
+        Question.session_id == session_id,
+        Question.answer_text.isnot(None)  # Only include answered questions
+    ).order_by(Question.id.desc()).limit(history_limit).subquery()
+
+    rows = db.query(
+        recent_questions.c.question_text,
+        recent_questions.c.answer_text,
+        recent_questions.c.chart_data
+    ).select_from(SessionModel).outerjoin(
+        recent_questions, recent_questions.c.session_id == SessionModel.id
+    ).filter(
+        SessionModel.id == session_id,
+        SessionModel.user_id == user_id
+    ).order_by(recent_questions.c.id.asc()).all()
+
+    if not rows:
+        return None
+
+    # Rows are re-sorted ascending in SQL, so history is already oldest first
+    conversation_history = [
+        (question_text,
+         f'{answer_text}: {chart_data}'[:HISTORY_ANSWER_MAX_CHARS])
+        if include_charts and chart_data else
+        (question_text, answer_text)
+        for question_text, answer_text, chart_data in rows
+        if question_text is not None
+    ]
+    logger.debug(
+        "Found %d previous Q&A pairs for context", len(conversation_history))
+
+    return conversation_history
+
+
+async def _upload_question_file(
+    content: bytes,
+    session_id: int,
+    filename: str,
+    file_type: str,
+    parsed_content: str
+) -> Optional[File]:
+    """
+    Upload a file sent alongside a question to S3 and build its File record.
+
+    The record is not added to the database, so it can be stored together
+    with the answered question by _persist_qa. A failed upload is logged
+    and does not prevent the question from being answered.
+
+    Args:
+        content: Raw file bytes
+        session_id: ID of the session the file belongs to
+        filename: Original name of the uploaded file
+        file_type: Stored file type (txt, csv, pdf)
+        parsed_content: Text extracted from the file
+
+    Returns:
+        Unsaved File record with its content, or None if the upload failed
+    """
+    try:
+        s3_key = await upload_file_to_s3(content, session_id, filename)
+        logger.info(f"File uploaded to S3, key: {s3_key}")
+    except Exception as e:
+        logger.error(f"Error uploading file to S3: {str(e)}")
+        return None
+
+    return File(
+        session_id=session_id,
+        filename=filename,
+        file_type=file_type,
+        s3_key=s3_key,
+        file_size=len(content),
+        contents=FileContent(content=parsed_content)
+    )
+
+
+async def _ingest_uploaded_file(
+    file: UploadFile,
+    session_id: int
+) -> Tuple[str, str, Optional[ChunkIndex], "asyncio.Task[Optional[File]]"]:
+    """
+    Validate, parse and start uploading a file sent alongside a question.
+
+    The parsed content is returned for immediate use. The S3 upload runs in
+    a task so it overlaps with answering the question; the task resolves to
+    the unsaved File record (see _upload_question_file).
+
+    Args:
+        file: The uploaded file
+        session_id: ID of the session the file belongs to
+
+    Returns:
+        Tuple of (parsed text content, fingerprint of the raw file bytes,
+        chunk index if the content is too long to send whole, upload task)
+
+    Raises:
+        HTTPException: If the file type is not supported
+    """
+    # Read the file once; the MIME type is detected from its first bytes
+    logger.debug("Reading file: %s", file.filename)
+    content = await read_upload(file)
+    mime_type = detect_mime_type(content[:2048], file.filename)
+    logger.debug("File MIME type: %s", mime_type)
+
+    # Check if file type is supported
+    if mime_type not in SUPPORTED_MIME_TYPES:
+        logger.warning(f"Unsupported file type: {mime_type}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File type {mime_type} is not supported. Supported types are TXT, CSV, and PDF."
+        )
+
+    logger.debug("File size: %d bytes", len(content))
+
+    # Map MIME type to file type
+    file_type = MIME_TYPE_TO_FILE_TYPE.get(mime_type, "txt")
+
+    # Fingerprint the upload once; it keys both the parse and answer caches
+    content_hash = content_fingerprint(content)
+
+    # Parse the file content directly for immediate use
+    logger.debug("Parsing file content, type: %s", file_type)
+    parsed_content = await _parse_file_content_cached(content, file_type, content_hash)
+
+    # Upload to S3 in the background while the question is answered
+    upload_task = asyncio.create_task(_upload_question_file(
+        content, session_id, file.filename, file_type, parsed_content))
+
+    # Index long documents now so questions only pay for a similarity search
+    try:
+        chunk_index = await _get_chunk_index(parsed_content, content_hash)
+    except BaseException:
+        # Only cancellation gets here. The caller never receives the upload
+        # task, so store the file here.
+        _schedule_persist_qa_after_upload(upload_task, session_id, None, None)
+        raise
+
+    return parsed_content, content_hash, chunk_index, upload_task
+
+
+def _insert_insights(db: Session, insight_rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert insight rows in one statement and commit them.
+
+    Args:
+        db: Database session
+        insight_rows: Column values for each Insight row
+    """
+    try:
+        with db_write_lock:
+            db.bulk_insert_mappings(Insight, insight_rows)
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _persist_qa(
+    session_id: int,
+    question_text: Optional[str],
+    answer_text: Optional[str],
+    uploaded_file: Optional[File] = None
+) -> None:
+    """
+    Persist an answered question in a session.
+
+    Opens its own database session rather than reusing the request's, so it
+    can run in a worker thread or as a background task after the response
+    has been sent. A file uploaded with the question is stored in the same
+    transaction.
+
+    Args:
+        session_id: ID of the session the question belongs to
+        question_text: The question as asked
+        answer_text: The generated answer, or None if the question was not
+            answered, in which case only the uploaded file is stored
+        uploaded_file: Unsaved File record (with its content) to store too
+    """
+    if answer_text is None and uploaded_file is None:
+        return
+
+    db = SessionFactory()
+    try:
+        if uploaded_file is not None:
+            db.add(uploaded_file)
+        if answer_text is not None:
+            question = Question(
+                session_id=session_id,
+                question_text=question_text,
+                answer_text=answer_text
+            )
+            db.add(question)
+        with db_write_lock:
+            db.commit()
+        logger.debug("Question and answer stored in database")
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Failed to store question in database: {str(e)}")
+    finally:
+        db.close()
+
+
+async def _persist_qa_after_upload(
+    upload_task: "asyncio.Task[Optional[File]]",
+    session_id: int,
+    question_text: Optional[str],
+    answer_text: Optional[str]
+) -> None:
+    """
+    Wait for a question's file upload, then persist the file and the answer.
+
+    Args:
+        upload_task: Task returned by _ingest_uploaded_file
+        session_id: ID of the session the question belongs to
+        question_text: The question as asked
+        answer_text: The generated answer, or None to store only the file
+    """
+    uploaded_file = await upload_task
+    await asyncio.to_thread(
+        _persist_qa, session_id, question_text, answer_text, uploaded_file)
+
+
+# Persist tasks started outside a response's background tasks, referenced
+# until they finish so they are not garbage collected mid-run
+_pending_persists: Set["asyncio.Task[None]"] = set()
+
+
+def _track_persist_task(coro: Awaitable[None]) -> None:
+    """
+    Run a persist coroutine in its own task, kept referenced until it finishes.
+
+    Args:
+        coro: The coroutine that stores the data
+    """
+    task = asyncio.ensure_future(coro)
+    _pending_persists.add(task)
+    task.add_done_callback(_pending_persists.discard)
+
+
+def _schedule_persist_qa_after_upload(
+    upload_task: "asyncio.Task[Optional[File]]",
+    session_id: int,
+    question_text: Optional[str],
+    answer_text: Optional[str]
+) -> None:
+    """
+    Run _persist_qa_after_upload in its own task.
+
+    Used where the response's background tasks will not run, e.g. when the
+    request fails after the upload started, so the file is still stored.
+
+    Args:
+        upload_task: Task returned by _ingest_uploaded_file
+        session_id: ID of the session the question belongs to
+        question_text: The question as asked
+        answer_text: The generated answer, or None to store only the file
+    """
+    _track_persist_task(_persist_qa_after_upload(
+        upload_task, session_id, question_text, answer_text))
+
+
+def _persist_visualization_question(
+    db: Session,
+    session_id: int,
+    question_text: str,
+    answer_text: str,
+    chart_data: Any,
+    chart_type: str
+) -> Question:
+    """
+    Persist a visualization question with its chart.
+
+    Args:
+        db: Database session
+        session_id: ID of the session the question belongs to
+        question_text: The question as asked
+        answer_text: The answer shown with the chart
+        chart_data: Parsed chart data
+        chart_type: Type of chart
+
+    Returns:
+        Question: The stored question record
+    """
+    question_record = Question(
+        session_id=session_id,
+        question_text=question_text,
+        answer_text=answer_text,
+        chart_data=chart_data,
+        chart_type=chart_type
+    )
+    db.add(question_record)
+    try:
+        with db_write_lock:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    db.refresh(question_record)
+    return question_record
+
+
+def _load_last_file_content(db: Session, session_id: int) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    Load the most recently uploaded file in a session with its content.
+
+    Args:
+        db: Database session
+        session_id: ID of the session
+
+    Returns:
+        Tuple of (filename, parsed content or None), or None if the session
+        has no files
+    """
+    return db.query(File.filename, FileContent.content).outerjoin(
+        FileContent, FileContent.file_id == File.id
+    ).filter(
+        File.session_id == session_id
+    ).order_by(File.id.desc()).first()
+
+
+def _load_qa_context(
+    db: Session,
+    session_id: int,
+    user_id: int,
+    history_limit: int,
+    include_charts: bool = False
+) -> Tuple[bool, str, List[Tuple[str, str]]]:
+    """
+    Load everything needed to answer a question in a session.
+
+    Verifies session ownership while fetching the recent conversation
+    history, then builds the combined file context. The combined context is
+    cached per session and only rebuilt when the session's file contents
+    change.
+
+    Args:
+        db: Database session
+        session_id: ID of the session being asked about
+        user_id: ID of the user who must own the session
+        history_limit: Number of previous Q&A pairs to include
+        include_charts: Whether to append chart data to historical answers
+
+    Returns:
+        Tuple of (whether the session was found, combined context,
+        conversation history as (question, answer) tuples)
+    """
+    conversation_history = _load_owned_session_history(
+        db, session_id, user_id, history_limit, include_charts)
+    if conversation_history is None:
+        return False, "", []
+
+    # Cheap version stamp: changes whenever a file content is added or removed
+    content_count, latest_processed_at = db.query(
+        func.count(FileContent.id), func.max(FileContent.processed_at)
+    ).join(File).filter(File.session_id == session_id).one()
+    cache_key = (session_id, (content_count, latest_processed_at))
+
+    context = _get_cached_context(cache_key) if content_count else None
+    if context is None:
+        file_texts = _load_session_file_texts(db, session_id)
+        context = "\n\n".join(file_texts)
+        logger.debug("Combined context length: %d characters", len(context))
+        if file_texts:
+            _set_cached_context(cache_key, context)
+    else:
+        logger.debug("Using cached context for session %s", session_id)
+
+    return True, context, conversation_history
+
+
+# Caps in-flight OpenAI calls so request bursts queue here instead of
+# being rejected by the provider with 429s
+_openai_semaphore = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENCY)
+
+# Blocking OpenAI calls get their own threads so slow completions cannot
+# starve the default executor used for database and file work
+_llm_executor = ThreadPoolExecutor(
+    max_workers=settings.OPENAI_MAX_CONCURRENCY, thread_name_prefix="llm")
+
+# Calls queued beyond this are rejected with a 429 rather than left waiting
+LLM_MAX_QUEUED_CALLS = settings.OPENAI_MAX_CONCURRENCY * 4
+_llm_queued_calls = 0
+
+T = TypeVar("T")
+
+
+class LLMQueueFullError(Exception):
+    """Raised when too many OpenAI calls are already waiting to run."""
 
-router = APIRouter(prefix="/analysis", tags=["analysis"])
+
+@asynccontextmanager
+async def _llm_slot() -> AsyncIterator[None]:
+    """
+    Hold an OpenAI concurrency slot, waiting in the bounded queue for one.
+
+    Used directly by async OpenAI calls (streams, visualizations); blocking
+    calls go through _run_llm_call.
+
+    Raises:
+        LLMQueueFullError: If the queue of waiting calls is already full
+    """
+    global _llm_queued_calls
+    if _llm_queued_calls >= LLM_MAX_QUEUED_CALLS:
+        raise LLMQueueFullError(f"{_llm_queued_calls} OpenAI calls already queued")
+
+    _llm_queued_calls += 1
+    try:
+        async with _openai_semaphore:
+            yield
+    finally:
+        _llm_queued_calls -= 1
+
+
+async def _run_llm_call(func: Callable[..., T], *args: Any) -> T:
+    """
+    Run a blocking OpenAI call on the LLM executor under the concurrency limit.
+
+    Args:
+        func: The blocking function to call
+        *args: Positional arguments for func
+
+    Returns:
+        The return value of func
+
+    Raises:
+        LLMQueueFullError: If the queue of waiting calls is already full
+    """
+    async with _llm_slot():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_llm_executor, functools.partial(func, *args))
+
+# Reuses answers to near-duplicate questions about the same file content
+_answer_cache = SemanticAnswerCache(threshold=settings.SEMANTIC_CACHE_THRESHOLD)
+
+
+def _answer_cache_scope(
+    session_id: int,
+    content_hash: str,
+    conversation_history: List[Tuple[str, str]]
+) -> str:
+    """
+    Build the semantic answer cache bucket for a question.
+
+    Answers are only reused within the same session, for the same content
+    and the same conversation history, so users never see each other's
+    answers and follow-ups are not answered without their earlier turns.
+    """
+    return content_fingerprint(
+        orjson.dumps([session_id, content_hash, conversation_history]))
+
+
+def _rate_limited_error(error: Exception) -> HTTPException:
+    """
+    Convert an OpenAI rate limit error or a full LLM queue into a 429 for the client.
+
+    Args:
+        error: The RateLimitError or LLMQueueFullError that was raised
+
+    Returns:
+        HTTPException: A 429 carrying the provider's Retry-After, if any
+    """
+    retry_after = None
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+    logger.warning(f"OpenAI capacity exceeded ({type(error).__name__}), retry after {retry_after or 1}s")
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="The analysis service is busy. Please try again shortly.",
+        headers={"Retry-After": str(retry_after or 1)}
+    )
+
+
+# Answers to exact repeats of a question (same session, context and history),
+# e.g. page reloads and client retries after the first call finished. Both
+# the plain and the streaming paths store (answer, sources) tuples, so either
+# can serve an answer cached by the other.
+QA_CACHE_TTL_SECONDS = 24 * 60 * 60
+QA_CACHE_MAX_SIZE = 1024
+QA_CACHE_REPLAY_CHUNK_SIZE = 20
+_qa_cache: Dict[Tuple[int, str], Tuple[float, Tuple[str, List[str]]]] = {}
+
+
+def _qa_cache_key(
+    session_id: int,
+    question: str,
+    context: str,
+    conversation_history: List[Tuple[str, str]]
+) -> Tuple[int, str]:
+    """Build the cache key for a question, scoped to its session."""
+    return (session_id, content_fingerprint(
+        orjson.dumps([question, context, conversation_history])))
+
+
+def _qa_cache_get(key: Tuple[int, str]) -> Optional[Tuple[str, List[str]]]:
+    """Return a cached answer if present and not expired."""
+    entry = _qa_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at < time.monotonic():
+        _qa_cache.pop(key, None)
+        return None
+    return value
+
+
+def _qa_cache_set(key: Tuple[int, str], value: Tuple[str, List[str]]) -> None:
+    """Store an answer, evicting the oldest entry when the cache is full."""
+    if len(_qa_cache) >= QA_CACHE_MAX_SIZE:
+        _qa_cache.pop(next(iter(_qa_cache)), None)
+    _qa_cache[key] = (time.monotonic() + QA_CACHE_TTL_SECONDS, value)
+
+
+# In-flight answer calls keyed by (session_id, fingerprint of the inputs), so
+# identical concurrent questions (double clicks, client retries) share one call
+_inflight_answers: Dict[Tuple[int, str], "asyncio.Task[Tuple[str, List[str]]]"] = {}
+
+
+async def _run_answer_question(
+    question: str,
+    context: str,
+    conversation_history: List[Tuple[str, str]]
+) -> Tuple[str, List[str]]:
+    """Run answer_question on the LLM executor under the OpenAI concurrency limit."""
+    return await _run_llm_call(answer_question, question, context, conversation_history)
+
+
+async def _answer_question_limited(
+    session_id: int,
+    question: str,
+    context: str,
+    conversation_history: List[Tuple[str, str]]
+) -> Tuple[str, List[str]]:
+    """
+    Answer a question, reusing a cached answer or an identical call in flight.
+
+    The call runs as a task shielded from the caller, so a disconnecting
+    client does not cancel it for other callers waiting on the same answer.
+
+    Args:
+        session_id: ID of the session the question is asked in
+        question: The user's question
+        context: The text content to use as reference
+        conversation_history: List of previous (question, answer) tuples
+
+    Returns:
+        Tuple containing the answer and sources
+    """
+    key = _qa_cache_key(session_id, question, context, conversation_history)
+    cached_answer = _qa_cache_get(key)
+    if cached_answer is not None:
+        logger.info(f"Answer served from cache for session {session_id}")
+        return cached_answer
+
+    # No await between the lookup and the insert, so this is race-free on
+    # the event loop without a lock
+    task = _inflight_answers.get(key)
+    if task is None:
+        task = asyncio.ensure_future(
+            _run_answer_question(question, context, conversation_history))
+        _inflight_answers[key] = task
+        task.add_done_callback(lambda _: _inflight_answers.pop(key, None))
+    else:
+        logger.info(f"Joining in-flight answer for session {session_id}")
+
+    answer = await asyncio.shield(task)
+    _qa_cache_set(key, answer)
+    return answer
+
+
+async def _answer_question_stream_limited(
+    session_id: int,
+    question: str,
+    context: str,
+    conversation_history: List[Tuple[str, str]]
+) -> AsyncGenerator[str, None]:
+    """
+    Stream an answer while holding an OpenAI concurrency slot.
+
+    Exact repeats of a question are replayed from the answer cache in small
+    chunks; complete answers are cached once the stream finishes.
+
+    Args:
+        session_id: ID of the session the question is asked in
+        question: The user's question
+        context: The text content to use as reference
+        conversation_history: List of previous (question, answer) tuples
+
+    Yields:
+        Chunks of the answer
+    """
+    key = _qa_cache_key(session_id, question, context, conversation_history)
+    cached_answer = _qa_cache_get(key)
+    if cached_answer is not None:
+        logger.info(f"Streaming answer from cache for session {session_id}")
+        answer_text = cached_answer[0]
+        for start in range(0, len(answer_text), QA_CACHE_REPLAY_CHUNK_SIZE):
+            yield answer_text[start:start + QA_CACHE_REPLAY_CHUNK_SIZE]
+        return
+
+    answer_parts = []
+    async with _llm_slot():
+        async for token in answer_question_stream(question, context, conversation_history):
+            answer_parts.append(token)
+            yield token
+
+    complete_answer = "".join(answer_parts)
+    if complete_answer and not complete_answer.endswith(QA_STREAM_ERROR_MESSAGE):
+        # Streamed answers carry no sources
+        _qa_cache_set(key, (complete_answer, []))
+
+
+# Reuses analyses of identical or near-identical texts
+_analysis_cache = AnalysisCache(threshold=settings.ANALYSIS_CACHE_THRESHOLD)
+
+
+# Keeps file analyses on disk so reopening an unchanged file skips the LLM,
+# even after a restart. The file is opened on first use and capped in size.
+_analysis_store = AnalysisStore(
+    settings.ANALYSIS_STORE_PATH, settings.ANALYSIS_STORE_MAX_ENTRIES)
+
+
+async def _analyze_file_text_stored(file_id: int, text: str) -> Dict[str, Any]:
+    """
+    Analyze a file's text, reusing the stored result if the text is unchanged.
+
+    The store is checked before an LLM slot is taken, so stored results are
+    served even when the LLM queue is full. Store failures are logged and
+    fall through to a normal analysis. Failed analyses are never stored.
+
+    Args:
+        file_id: The ID of the file being analyzed
+        text: The text content to analyze
+
+    Returns:
+        Dict with analysis results
+
+    Raises:
+        LLMQueueFullError: If the text has to be analyzed and the LLM queue is full
+    """
+    key = f"{file_id}:{content_fingerprint(text)}"
+    try:
+        stored_result = await asyncio.to_thread(_analysis_store.get, key)
+        if stored_result is not None:
+            logger.info(f"Analysis for file {file_id} served from store")
+            return stored_result
+    except Exception as e:
+        logger.warning(f"Analysis store lookup failed: {str(e)}")
+
+    analysis_results = await _analyze_text_cached(text)
+    if analysis_results.get("analysis") != ANALYSIS_ERROR_MESSAGE:
+        try:
+            await asyncio.to_thread(_analysis_store.set, key, analysis_results)
+        except Exception as e:
+            logger.warning(f"Failed to store analysis: {str(e)}")
+    return analysis_results
+
+
+async def _analyze_text_cached(text: str) -> Dict[str, Any]:
+    """
+    Run analyze_text, reusing cached results for identical or near-identical texts.
+
+    The cache is checked before an LLM slot is taken, so hits never wait
+    for or get rejected by the LLM queue. Cache failures are logged and
+    fall through to a normal analysis. Failed analyses are never cached.
+
+    Args:
+        text: The text content to analyze
+
+    Returns:
+        Dict with analysis results
+
+    Raises:
+        LLMQueueFullError: If the text has to be analyzed and the LLM queue is full
+    """
+    text = text[:ANALYSIS_MAX_CHARS]
+    embedding = None
+    try:
+        cached_result, embedding = await asyncio.to_thread(_analysis_cache.get, text)
+        if cached_result is not None:
+            logger.info("Analysis served from cache")
+            return cached_result
+    except Exception as e:
+        logger.warning(f"Analysis cache lookup failed: {str(e)}")
+
+    analysis_results = await _run_llm_call(analyze_text, text)
+    if analysis_results.get("analysis") != ANALYSIS_ERROR_MESSAGE:
+        try:
+            await asyncio.to_thread(_analysis_cache.set, text, analysis_results, embedding)
+        except Exception as e:
+            logger.warning(f"Failed to cache analysis: {str(e)}")
+    return analysis_results
+
+
+# Streamed tokens are sent in batches to cut per-chunk ASGI and TCP overhead
+STREAM_FLUSH_MIN_CHARS = 64
+STREAM_FLUSH_MAX_DELAY_SECONDS = 0.05
+
+
+async def _coalesce_tokens(tokens: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+    """
+    Batch streamed tokens into fewer, larger chunks.
+
+    A batch is flushed once it holds enough characters or enough time has
+    passed since the last flush, so perceived latency is unchanged.
+    Buffered text is flushed before an error from the source is re-raised.
+
+    Args:
+        tokens: The token stream to batch
+
+    Yields:
+        Batches of concatenated tokens
+    """
+    buffer = []
+    buffered_chars = 0
+    last_flush = time.monotonic()
+    try:
+        async for token in tokens:
+            buffer.append(token)
+            buffered_chars += len(token)
+            now = time.monotonic()
+            if buffered_chars >= STREAM_FLUSH_MIN_CHARS or now - last_flush >= STREAM_FLUSH_MAX_DELAY_SECONDS:
+                yield "".join(buffer)
+                buffer.clear()
+                buffered_chars = 0
+                last_flush = now
+    except Exception:
+        if buffer:
+            yield "".join(buffer)
+        raise
+    if buffer:
+        yield "".join(buffer)
+
+
+def _history_as_dicts(conversation_history: List[Tuple[str, str]]) -> List[Dict[str, str]]:
+    """Convert (question, answer) history tuples into the response format."""
+    return [
+        {"question": question, "answer": answer}
+        for question, answer in conversation_history
+    ]
+
+
+def _topic_name(topic: Any) -> str:
+    """Return the display name of a topic given as a string or a {"name": ...} dict."""
+    if isinstance(topic, dict) and "name" in topic:
+        return topic["name"]
+    return str(topic)
 
 
 @router.post("/text", response_model=schemas.AnalysisResponse)
@@ -42,20 +1008,20 @@ async def analyze_text_content(
     If a session ID is provided, the analysis results are also stored in the database.
     """
     try:
-        # Get the raw request to log for debugging
-        body = await request.body()
-        logger.debug(f"Raw request body: {body.decode()}")
-
-        # Parse the request body
+        # Parse the request body. Pydantic has normally parsed it already;
+        # the raw body is only read and logged when falling back.
         try:
             if analysis_request is None:
-                request_data = await request.json()
-                logger.debug(f"Manual JSON parse: {request_data}")
+                body = await request.body()
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Raw request body: %s", body.decode())
+                request_data = orjson.loads(body)
                 # Extract required fields
                 session_id = request_data.get("session_id")
                 text = request_data.get("text", "")
             else:
-                logger.debug(f"Using Pydantic model: {analysis_request}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Using Pydantic model: %s", analysis_request)
                 session_id = analysis_request.session_id
                 text = analysis_request.text
 
@@ -73,12 +1039,7 @@ async def analyze_text_content(
 
         # Verify session belongs to user
         if session_id:
-            session = db.query(SessionModel).filter(
-                SessionModel.id == session_id,
-                SessionModel.user_id == current_user.id
-            ).first()
-
-            if not session:
+            if not await asyncio.to_thread(user_owns_session, db, session_id, current_user.id):
                 logger.warning(
                     f"Session not found: {session_id} for user {current_user.id}")
                 raise HTTPException(
@@ -89,82 +1050,42 @@ async def analyze_text_content(
             # If no session_id is provided, we'll still analyze the text but won't store the results
             logger.info(
                 "No session_id provided, will analyze text without storing insights")
-            session = None
 
         # Analyze the text
         logger.info(f"Beginning text analysis for user {current_user.id}")
-        analysis_results = analyze_text(text)
+        analysis_results = await _analyze_text_cached(text)
         logger.info(f"Text analysis complete for user {current_user.id}")
 
         # If a session was provided, store the insights
-        if session:
-            logger.debug(f"Storing insights for session {session.id}")
+        if session_id:
+            logger.debug("Storing insights for session %s", session_id)
             try:
                 # Store sentiment analysis
                 sentiment_value = analysis_results["sentiment"]
                 if "overall" not in sentiment_value:
-                    # Determine overall sentiment based on scores
-                    pos = sentiment_value.get("positive", 0)
-                    neg = sentiment_value.get("negative", 0)
-                    neu = sentiment_value.get("neutral", 0)
-
-                    if pos > neg and pos > neu:
-                        sentiment_value["overall"] = "positive"
-                    elif neg > pos and neg > neu:
-                        sentiment_value["overall"] = "negative"
-                    else:
-                        sentiment_value["overall"] = "neutral"
-
-                sentiment_insight = Insight(
-                    session_id=session.id,
-                    insight_type="sentiment",
-                    value=sentiment_value
-                )
-                db.add(sentiment_insight)
+                    sentiment_value["overall"] = overall_sentiment(sentiment_value)
 
                 # Store emotion analysis
                 emotion_value = analysis_results["emotions"]
                 if "dominant_emotion" not in emotion_value:
-                    # Find dominant emotion
-                    dominant = "neutral"
-                    max_score = 0
-                    for emotion, score in emotion_value.items():
-                        if emotion != "dominant_emotion" and score > max_score:
-                            max_score = score
-                            dominant = emotion
-
-                    emotion_value["dominant_emotion"] = dominant
-
-                emotion_insight = Insight(
-                    session_id=session.id,
-                    insight_type="emotion",
-                    value=emotion_value
-                )
-                db.add(emotion_insight)
-
-                # Store topics
-                for topic_name in analysis_results["topics"]:
-                    # Check if the topic is a dict or string
-                    if isinstance(topic_name, dict) and "name" in topic_name:
-                        topic_text = topic_name["name"]
-                    else:
-                        topic_text = str(topic_name)
-
-                    topic_insight = Insight(
-                        session_id=session.id,
-                        insight_type="topic",
-                        value={"name": topic_text}
-                    )
-                    db.add(topic_insight)
-
-                # Commit all insights
-                db.commit()
+                    emotion_value["dominant_emotion"] = dominant_emotion(emotion_value)
+
+                # Insert sentiment, emotion and topic insights in one statement
+                insight_rows = [
+                    {"session_id": session_id, "insight_type": "sentiment",
+                        "value": sentiment_value},
+                    {"session_id": session_id, "insight_type": "emotion",
+                        "value": emotion_value},
+                ] + [
+                    {"session_id": session_id, "insight_type": "topic",
+                        "value": {"name": _topic_name(topic)}}
+                    for topic in analysis_results["topics"]
+                ]
+                await asyncio.to_thread(_insert_insights, db, insight_rows)
                 logger.debug(
-                    f"Insights stored successfully for session {session.id}")
+                    "Insights stored successfully for session %s", session_id)
             except Exception as e:
-                db.rollback()
-                logger.error(f"Error storing insights: {str(e)}")
-                logger.error(traceback.format_exc())
+                logger.exception(f"Error storing insights: {str(e)}")
                 # Continue so we can still return the analysis results
 
         # Return the analysis results
@@ -175,9 +1096,10 @@ async def analyze_text_content(
             "summary": analysis_results["summary"]
         }
 
+    except LLMQueueFullError as e:
+        raise _rate_limited_error(e)
     except Exception as e:
-        logger.error(f"Error in text analysis: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error in text analysis: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing text analysis: {str(e)}"
@@ -198,10 +1120,7 @@ async def analyze_file(
     """
     logger.info(f"Starting file analysis for file_id {file_id}")
     # Get file from database, ensuring it belongs to the user
-    file = db.query(File).join(SessionModel).filter(
-        File.id == file_id,
-        SessionModel.user_id == current_user.id
-    ).first()
+    file = await asyncio.to_thread(_get_owned_file, db, file_id, current_user.id)
 
     if not file:
         logger.warning(f"File not found: {file_id} for user {current_user.id}")
@@ -211,95 +1130,32 @@ async def analyze_file(
         )
 
     # Get all file contents for the session to use as context
-    file_contents = db.query(FileContent).join(File).filter(
-        File.session_id == file.session_id
-    ).all()
-
-    logger.debug(
-        f"File content query: session_id={file.session_id}, found {len(file_contents) if file_contents else 0} files")
-
-    # Additional debugging - check if files exist without content
-    files_without_content = db.query(File).filter(
-        File.session_id == file.session_id
-    ).all()
-    logger.debug(
-        f"Files in session: {len(files_without_content) if files_without_content else 0}")
-
-    if files_without_content and not file_contents:
-        # Files exist but no content found - potential join issue
-        logger.warning(
-            f"Files exist in session {file.session_id} but no content found. Trying direct relationship.")
-
-        # Try accessing contents directly through relationship
-        direct_content_list = []
-        for file in files_without_content:
-            logger.debug(f"Checking file {file.id} for contents")
-            if hasattr(file, 'contents') and file.contents:
-                logger.debug(
-                    f"Found content for file {file.id} using direct relationship")
-                direct_content_list.append(file.contents)
-
-        if direct_content_list:
-            logger.info(
-                f"Retrieved {len(direct_content_list)} file contents using direct relationships")
-            file_contents = direct_content_list
-        else:
-            # If still no content, try looking up directly by file IDs
-            file_ids = [f.id for f in files_without_content]
-            logger.debug(
-                f"Looking up content directly by file IDs: {file_ids}")
-
-            direct_file_contents = db.query(FileContent).filter(
-                FileContent.file_id.in_(file_ids)
-            ).all()
-
-            if direct_file_contents:
-                logger.info(
-                    f"Found {len(direct_file_contents)} file contents when querying directly by file_id")
-                file_contents = direct_file_contents
+    file_texts = await asyncio.to_thread(
+        _load_session_file_texts, db, file.session_id)
 
     # Analyze the content
     logger.info(f"Analyzing content for file {file.filename}")
-    analysis_results = analyze_text(file_contents[0])
+    try:
+        analysis_results = await _analyze_file_text_stored(file.id, file_texts[0])
+    except LLMQueueFullError as e:
+        raise _rate_limited_error(e)
     logger.info(f"Analysis complete for file {file.filename}")
 
-    # Store insights
-    logger.debug(f"Storing insights in session {file.session_id}")
-    # Store sentiment analysis
-    sentiment_insight = Insight(
-        session_id=file.session_id,
-        insight_type="sentiment",
-        value=analysis_results["sentiment"]
-    )
-    db.add(sentiment_insight)
-
-    # Store emotion analysis
-    emotion_insight = Insight(
-        session_id=file.session_id,
-        insight_type="emotion",
-        value=analysis_results["emotions"]
-    )
-    db.add(emotion_insight)
-
-    # Store topics
+    # Store insights in one statement
+    logger.debug("Storing insights in session %s", file.session_id)
+    insight_rows = [
+        {"session_id": file.session_id, "insight_type": "sentiment",
+            "value": analysis_results["sentiment"]},
+        {"session_id": file.session_id, "insight_type": "emotion",
+            "value": analysis_results["emotions"]},
+    ]
     if analysis_results["topics"]:
-        topics_insight = Insight(
-            session_id=file.session_id,
-            insight_type="topic",
-            value={"topics": analysis_results["topics"]}
-        )
-        db.add(topics_insight)
-
-    # Store summary
-    summary_insight = Insight(
-        session_id=file.session_id,
-        insight_type="summary",
-        value={"summary": analysis_results["summary"]}
-    )
-    db.add(summary_insight)
-
-    db.commit()
-    logger.debug(f"Successfully stored all insights for file {file.filename}")
+        insight_rows.append({"session_id": file.session_id, "insight_type": "topic",
+                             "value": {"topics": analysis_results["topics"]}})
+    insight_rows.append({"session_id": file.session_id, "insight_type": "summary",
+                         "value": {"summary": analysis_results["summary"]}})
+    await asyncio.to_thread(_insert_insights, db, insight_rows)
+    logger.debug("Successfully stored all insights for file %s", file.filename)
 
     return analysis_results
 
@@ -319,87 +1175,37 @@ async def ask_question(
     """
     logger.info(
         f"Processing question for session {question_request.session_id}")
-    # Verify session belongs to user
-    session = db.query(SessionModel).filter(
-        SessionModel.id == question_request.session_id,
-        SessionModel.user_id == current_user.id
-    ).first()
 
-    if not session:
+    # Use the history_limit from the request, defaulting to 5
+    history_limit = question_request.history_limit if question_request.history_limit is not None else 5
+
+    session_id = question_request.session_id
+    session_found, context, conversation_history = await asyncio.to_thread(
+        _load_qa_context,
+        db,
+        session_id,
+        current_user.id,
+        history_limit
+    )
+
+    if not session_found:
         logger.warning(
-            f"Session not found: {question_request.session_id} for user {current_user.id}")
+            f"Session not found: {session_id} for user {current_user.id}")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Session not found"
         )
 
-    # Get all file contents for the session to use as context
-    file_contents = db.query(FileContent).join(File).filter(
-        File.session_id == session.id
-    ).all()
-
-    logger.debug(
-        f"File content query: session_id={session.id}, found {len(file_contents) if file_contents else 0} files")
-
-    # If no content found, try the direct relationship method
-    if not file_contents:
-        logger.info(
-            f"Using direct relationship navigation for session {session.id}")
-        file_contents = session.get_all_file_contents()
-        logger.debug(
-            f"Direct navigation found {len(file_contents)} file contents")
-
-    # Additional debugging - check if files exist without content
-    files_without_content = db.query(File).filter(
-        File.session_id == session.id
-    ).all()
-    logger.debug(
-        f"Files in session: {len(files_without_content) if files_without_content else 0}")
-
-    if files_without_content and not file_contents:
-        # Files exist but no content found - potential join issue
-        logger.warning(
-            f"Files exist in session {session.id} but no content found. Trying direct relationship.")
-        # Get file IDs for debugging
-        file_ids = [f.id for f in files_without_content]
-        logger.debug(f"File IDs in session: {file_ids}")
-
-        # Try to query file contents directly by file IDs
-        direct_file_contents = db.query(FileContent).filter(
-            FileContent.file_id.in_(file_ids)
-        ).all()
-
-        if direct_file_contents:
-            logger.info(
-                f"Found {len(direct_file_contents)} file contents when querying directly by file_id")
-            file_contents = direct_file_contents
-
-    # Get previous questions and answers for this session (conversation history)
-    # Use the history_limit from the request, defaulting to 5
-    history_limit = question_request.history_limit if question_request.history_limit is not None else 5
-
-    previous_questions = db.query(Question).filter(
-        Question.session_id == session.id,
-        Question.answer_text.isnot(None)  # Only include answered questions
-    ).order_by(Question.created_at.desc()).limit(history_limit).all()
-
-    # Create conversation history in reverse chronological order (oldest first)
-    conversation_history = [
-        {"question": q.question_text, "answer": q.answer_text}
-        for q in reversed(previous_questions)
-    ]
-    logger.debug(
-        f"Found {len(conversation_history)} previous Q&A pairs for context")
-
-    if not file_contents:
-        logger.warning(f"No file contents found for session {session.id}")
+    if not context:
+        logger.warning(f"No file contents found for session {session_id}")
         # No files uploaded, but we should still answer the question using general knowledge
         logger.info(
             "Answering question using general knowledge without file context")
 
         try:
             # Use conversation history for context
-            answer_text, sources = answer_question(
+            answer_text, sources = await _answer_question_limited(
+                session_id,
                 question_request.question,
                 "",  # Empty context, rely on model's general knowledge
                 conversation_history
@@ -408,22 +1214,18 @@ async def ask_question(
             logger.info("Generated answer from general knowledge")
 
             # Store the question and answer
-            question = Question(
-                session_id=session.id,
-                question_text=question_request.question,
-                answer_text=answer_text
-            )
-            db.add(question)
-            db.commit()
+            await asyncio.to_thread(
+                _persist_qa, session_id, question_request.question, answer_text)
 
             return {
                 "answer": answer_text,
                 "sources": sources if sources else [],
-                "conversation_history": conversation_history
+                "conversation_history": _history_as_dicts(conversation_history)
             }
+        except (RateLimitError, LLMQueueFullError) as e:
+            raise _rate_limited_error(e)
         except Exception as e:
-            logger.error(f"Error answering general question: {str(e)}")
-            logger.error(traceback.format_exc())
+            logger.exception(f"Error answering general question: {str(e)}")
 
             # Fallback message if the model fails
             answer = (
@@ -433,58 +1235,33 @@ async def ask_question(
             )
 
             # Store the question and answer
-            question = Question(
-                session_id=session.id,
-                question_text=question_request.question,
-                answer_text=answer
-            )
-            db.add(question)
-            db.commit()
+            await asyncio.to_thread(
+                _persist_qa, session_id, question_request.question, answer)
 
             return {
                 "answer": answer,
                 "sources": [],
-                "conversation_history": conversation_history
+                "conversation_history": _history_as_dicts(conversation_history)
             }
 
     # We have files, so proceed with normal processing
-    # Combine all file contents into a single context
-    context = "\n\n".join([fc.content for fc in file_contents])
-    logger.debug(f"Combined context length: {len(context)} characters")
-
     # Check if the question contains substantial text (more than 100 characters)
     # This could indicate the user pasted text directly in the question
-    contains_pasted_text = len(question_request.question) > 100
+    question_length = len(question_request.question)
+    contains_pasted_text = question_length > PASTED_TEXT_MIN_CHARS
 
-    if not file_contents and contains_pasted_text:
+    if not context and contains_pasted_text:
         logger.info(
-            f"Question appears to contain pasted text ({len(question_request.question)} chars). Using as context.")
+            f"Question appears to contain pasted text ({question_length} chars). Using as context.")
 
         # Extract text from the question to use as context
-        # We'll add a marker to help the model distinguish the question from the context
-        if "?" in question_request.question:
-            # Try to separate the question from the context based on the question mark
-            parts = question_request.question.split("?", 1)
-            # If there's substantial text after the question mark
-            if len(parts) > 1 and len(parts[1]) > 50:
-                actual_question = parts[0] + "?"
-                context_from_question = parts[1].strip()
-                logger.debug(
-                    f"Split question: '{actual_question}' and context: '{context_from_question[:50]}...'")
-            else:
-                # No clear separation, treat the whole thing as context
-                # and add a generic question about analysis
-                actual_question = "Can you analyze this text for me?"
-                context_from_question = question_request.question
-        else:
-            # No question mark, treat the whole thing as context
-            # and add a generic question about analysis
-            actual_question = "Can you analyze this text for me?"
-            context_from_question = question_request.question
+        actual_question, context_from_question = extract_question_and_context(
+            question_request.question)
 
         try:
             # Use the extracted context and question
-            answer_text, sources = answer_question(
+            answer_text, sources = await _answer_question_limited(
+                session_id,
                 actual_question,
                 context_from_question,
                 conversation_history
@@ -493,27 +1270,24 @@ async def ask_question(
             logger.info("Generated answer from pasted text in question")
 
             # Store the original question and answer
-            question = Question(
-                session_id=session.id,
-                question_text=question_request.question,
-                answer_text=answer_text
-            )
-            db.add(question)
-            db.commit()
+            await asyncio.to_thread(
+                _persist_qa, session_id, question_request.question, answer_text)
 
             return {
                 "answer": answer_text,
                 "sources": sources if sources else [],
-                "conversation_history": conversation_history
+                "conversation_history": _history_as_dicts(conversation_history)
             }
+        except (RateLimitError, LLMQueueFullError) as e:
+            raise _rate_limited_error(e)
         except Exception as e:
-            logger.error(f"Error analyzing pasted text: {str(e)}")
-            logger.error(traceback.format_exc())
+            logger.exception(f"Error analyzing pasted text: {str(e)}")
 
     # Answer the question with conversation history context
     logger.info(f"Processing question: {question_request.question[:50]}...")
     try:
-        answer_text, sources = answer_question(
+        answer_text, sources = await _answer_question_limited(
+            session_id,
             question_request.question,
             context,
             conversation_history
@@ -530,27 +1304,22 @@ async def ask_question(
                 sources = []
 
         logger.info(f"Question answered with {len(sources)} sources")
+    except (RateLimitError, LLMQueueFullError) as e:
+        raise _rate_limited_error(e)
     except Exception as e:
-        logger.error(f"Error answering question: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error answering question: {str(e)}")
         # Provide a fallback answer and empty sources list
         answer_text = f"I encountered an error processing your question about the uploaded content. Error: {str(e)}"
         sources = []
 
     # Store the question and answer
-    question = Question(
-        session_id=session.id,
-        question_text=question_request.question,
-        answer_text=answer_text
-    )
-    db.add(question)
-    db.commit()
-    logger.debug(f"Question and answer stored in database")
+    await asyncio.to_thread(
+        _persist_qa, session_id, question_request.question, answer_text)
 
     return {
         "answer": answer_text,
         "sources": sources,
-        "conversation_history": conversation_history
+        "conversation_history": _history_as_dicts(conversation_history)
     }
 
 
@@ -569,220 +1338,122 @@ async def stream_question_answer(
     logger.info(
         f"Processing streaming question for session {question_request.session_id}")
 
-    # Verify session belongs to user
-    session = db.query(SessionModel).filter(
-        SessionModel.id == question_request.session_id,
-        SessionModel.user_id == current_user.id
-    ).first()
+    history_limit = question_request.history_limit if question_request.history_limit is not None else 5
+
+    session_id = question_request.session_id
+    session_found, context, conversation_history = await asyncio.to_thread(
+        _load_qa_context,
+        db,
+        session_id,
+        current_user.id,
+        history_limit,
+        True
+    )
 
-    if not session:
+    if not session_found:
         logger.warning(
-            f"Session not found: {question_request.session_id} for user {current_user.id}")
+            f"Session not found: {session_id} for user {current_user.id}")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Session not found"
         )
 
-    # Get all file contents for the session to use as context
-    file_contents = db.query(FileContent).join(File).filter(
-        File.session_id == session.id
-    ).all()
-
-    logger.debug(
-        f"File content query (stream): session_id={session.id}, found {len(file_contents) if file_contents else 0} files")
-
-    # If no content found, try the direct relationship method
-    if not file_contents:
-        logger.info(
-            f"Using direct relationship navigation for stream in session {session.id}")
-        file_contents = session.get_all_file_contents()
-        logger.debug(
-            f"Direct navigation found {len(file_contents)} file contents for streaming")
-
-    # Additional debugging - check if files exist without content
-    files_without_content = db.query(File).filter(
-        File.session_id == session.id
-    ).all()
-    logger.debug(
-        f"Files in session (stream): {len(files_without_content) if files_without_content else 0}")
-
-    if files_without_content and not file_contents:
-        # Files exist but no content found - potential join issue
-        logger.warning(
-            f"Files exist in session {session.id} but no content found. Trying direct relationship.")
-
-        # Try accessing contents directly through relationship
-        direct_content_list = []
-        for file in files_without_content:
-            logger.debug(f"Checking file {file.id} for contents")
-            if hasattr(file, 'contents') and file.contents:
-                logger.debug(
-                    f"Found content for file {file.id} using direct relationship")
-                direct_content_list.append(file.contents)
-
-        if direct_content_list:
-            logger.info(
-                f"Retrieved {len(direct_content_list)} file contents using direct relationships")
-            file_contents = direct_content_list
-        else:
-            # If still no content, try looking up directly by file IDs
-            file_ids = [f.id for f in files_without_content]
-            logger.debug(
-                f"Looking up content directly by file IDs: {file_ids}")
-
-            direct_file_contents = db.query(FileContent).filter(
-                FileContent.file_id.in_(file_ids)
-            ).all()
-
-            if direct_file_contents:
-                logger.info(
-                    f"Found {len(direct_file_contents)} file contents when querying directly by file_id")
-                file_contents = direct_file_contents
-
-    # Get previous questions and answers (conversation history)
-    history_limit = question_request.history_limit if question_request.history_limit is not None else 5
-    previous_questions = db.query(Question).filter(
-        Question.session_id == session.id,
-        Question.answer_text.isnot(None)
-    ).order_by(Question.created_at.desc()).limit(history_limit).all()
-
-    # Create conversation history in reverse chronological order (oldest first)
-    conversation_history = [
-        {"question": q.question_text, "answer": q.answer_text} if not q.chart_data else
-        {"question": q.question_text, "answer": f'{q.answer_text}: {q.chart_data}'}
-        for q in reversed(previous_questions)
-    ]
+    # Check if the question contains substantial text, which could indicate
+    # the user pasted text directly in the question. Split it once here
+    # rather than inside the stream.
+    question_length = len(question_request.question)
+    contains_pasted_text = question_length > PASTED_TEXT_MIN_CHARS
+    if not context and contains_pasted_text:
+        actual_question, context_from_question = extract_question_and_context(
+            question_request.question)
 
     # Define the streaming response function
     async def generate_stream():
-        complete_answer = ""
-
-        # Check if the question contains substantial text (more than 100 characters)
-        # This could indicate the user pasted text directly in the question
-        contains_pasted_text = len(question_request.question) > 100
-
-        if not file_contents and contains_pasted_text:
-            logger.info(
-                f"Stream: Question appears to contain pasted text ({len(question_request.question)} chars)")
-
-            # Extract text from the question to use as context
-            if "?" in question_request.question:
-                # Try to separate the question from the context based on the question mark
-                parts = question_request.question.split("?", 1)
-                # If there's substantial text after the question mark
-                if len(parts) > 1 and len(parts[1]) > 50:
-                    actual_question = parts[0] + "?"
-                    context_from_question = parts[1].strip()
-                    logger.debug(
-                        f"Stream: Split into question: '{actual_question}' and context")
-                else:
-                    # No clear separation, treat the whole thing as context
-                    actual_question = "Can you analyze this text for me?"
-                    context_from_question = question_request.question
-            else:
-                # No question mark, treat the whole thing as context
-                actual_question = "Can you analyze this text for me?"
-                context_from_question = question_request.question
-
-            # Stream a response using the pasted text as context
-            try:
-                async for token in answer_question_stream(
-                    actual_question,
-                    context_from_question,
-                    conversation_history
-                ):
-                    complete_answer += token
-                    yield token
-            except Exception as e:
-                logger.error(
-                    f"Error streaming answer for pasted text: {str(e)}")
-                error_msg = f"I'm having trouble analyzing your text. Please try again."
-                complete_answer = error_msg
-                yield error_msg
-        elif not file_contents:
-            logger.warning(f"No file contents found for session {session.id}")
-            # No files, but we should still answer using general knowledge
-            logger.info(
-                "Streaming answer using general knowledge without file context")
-
-            # Stream a general knowledge response
-            try:
-                # Use the existing answer_question_stream but with empty context
-                async for token in answer_question_stream(
-                    question_request.question,
-                    "",  # Empty context, rely on model's general knowledge
-                    conversation_history
-                ):
-                    complete_answer += token
-                    yield token
-            except Exception as e:
-                logger.error(
-                    f"Error streaming general knowledge answer: {str(e)}")
-                error_msg = f"I'm having trouble processing your question. Please try again."
-                complete_answer = error_msg
-                yield error_msg
-        else:
-            # We have files, process normally
-            # Combine all file contents into a single context
-            context = "\n\n".join([fc.content for fc in file_contents])
-            logger.debug(f"Combined context length: {len(context)} characters")
-            logger.info(
-                f"Streaming answer for question about {len(file_contents)} files")
-
-            # Stream the answer
-            try:
-                async for token in answer_question_stream(
-                    question_request.question,
-                    context,
-                    conversation_history
-                ):
-                    complete_answer += token
-                    yield token
-            except Exception as e:
-                logger.error(f"Error streaming answer: {str(e)}")
-                error_msg = f"Error: {str(e)}"
-                complete_answer = error_msg
-                yield error_msg
-
-        # Store the complete question and answer after streaming is done
+        answer_parts = []
         try:
-            question = Question(
-                session_id=session.id,
-                question_text=question_request.question,
-                answer_text=complete_answer
-            )
-            db.add(question)
-            db.commit()
-            logger.debug(
-                "Question and answer stored in database after streaming")
-        except Exception as e:
-            logger.error(f"Failed to store question in database: {str(e)}")
-
-    # Helper function for streaming general knowledge responses when no files are available
-    # This is now deprecated as we use the main LLM model instead
-    async def mock_stream_response(question: str):
-        intro = "I'll answer based on my general knowledge since no files are available. "
-        for char in intro:
-            yield char
-            await asyncio.sleep(0.01)
-
-        if "analyze" in question.lower() and len(question) > 20:
-            msg = "I can analyze the text in your question instead. Or you can upload a file for more comprehensive analysis."
-        else:
-            msg = "I can answer general questions or help you analyze uploaded files. What else would you like to know?"
-
-        for char in msg:
-            yield char
-            await asyncio.sleep(0.01)
+            if not context and contains_pasted_text:
+                logger.info(
+                    f"Stream: Question appears to contain pasted text ({question_length} chars)")
+
+                # Stream a response using the pasted text as context
+                try:
+                    async for token in _coalesce_tokens(_answer_question_stream_limited(
+                        session_id,
+                        actual_question,
+                        context_from_question,
+                        conversation_history
+                    )):
+                        answer_parts.append(token)
+                        yield token
+                except Exception as e:
+                    logger.error(
+                        f"Error streaming answer for pasted text: {str(e)}")
+                    error_msg = f"I'm having trouble analyzing your text. Please try again."
+                    answer_parts = [error_msg]
+                    yield error_msg
+            elif not context:
+                logger.warning(f"No file contents found for session {session_id}")
+                # No files, but we should still answer using general knowledge
+                logger.info(
+                    "Streaming answer using general knowledge without file context")
+
+                # Stream a general knowledge response
+                try:
+                    # Use the existing answer_question_stream but with empty context
+                    async for token in _coalesce_tokens(_answer_question_stream_limited(
+                        session_id,
+                        question_request.question,
+                        "",  # Empty context, rely on model's general knowledge
+                        conversation_history
+                    )):
+                        answer_parts.append(token)
+                        yield token
+                except Exception as e:
+                    logger.error(
+                        f"Error streaming general knowledge answer: {str(e)}")
+                    error_msg = f"I'm having trouble processing your question. Please try again."
+                    answer_parts = [error_msg]
+                    yield error_msg
+            else:
+                # We have files, process normally
+                logger.info(
+                    f"Streaming answer for question with {len(context)} characters of context")
+
+                # Stream the answer
+                try:
+                    async for token in _coalesce_tokens(_answer_question_stream_limited(
+                        session_id,
+                        question_request.question,
+                        context,
+                        conversation_history
+                    )):
+                        answer_parts.append(token)
+                        yield token
+                except Exception as e:
+                    logger.error(f"Error streaming answer: {str(e)}")
+                    error_msg = f"Error: {str(e)}"
+                    answer_parts = [error_msg]
+                    yield error_msg
+        finally:
+            # Store the question and answer once the stream ends. This also
+            # runs if the client disconnects mid-stream, when background
+            # tasks are skipped, keeping whatever part of the answer was sent.
+            _track_persist_task(asyncio.to_thread(
+                _persist_qa,
+                session_id,
+                question_request.question,
+                "".join(answer_parts) or None
+            ))
 
     # Return the streaming response
     return StreamingResponse(
         generate_stream(),
-        media_type="text/plain"
+        media_type="text/plain",
+        headers={"X-Accel-Buffering": "no"}
     )
 
 
-@router.post("/test", response_model=dict)
+@router.post("/test")
 async def test_analysis(
     request: Request,
     current_user: User = Depends(get_current_active_user)
@@ -791,11 +1462,11 @@ async def test_analysis(
     try:
         # Get raw request body to diagnose validation errors
         raw_body = await request.body()
-        logger.debug(f"Raw test request body: {raw_body}")
+        logger.debug("Raw test request body: %s", raw_body)
 
         try:
-            json_body = await request.json()
-            logger.debug(f"JSON test request body: {json_body}")
+            json_body = orjson.loads(raw_body)
+            logger.debug("JSON test request body: %s", json_body)
 
             # Extract text for response
             text = json_body.get("text", "No text provided")
@@ -806,7 +1477,7 @@ async def test_analysis(
 
         # Return data in the expected format
         logger.info("Returning mock analysis results")
-        return {
+        return ORJSONResponse({
             "sentiment": {"positive": 0.7, "negative": 0.1, "neutral": 0.2},
             "emotions": {
                 "joy": 0.7,
@@ -818,14 +1489,14 @@ async def test_analysis(
             },
             "topics": ["communication", "analysis", "testing", "development"],
             "summary": f"Analysis of your message: '{text[:30]}...'. This message appears to express positive sentiment with joy being the dominant emotion."
-        }
+        })
     except Exception as e:
         logger.error(f"Error in test_analysis: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.debug("Traceback follows", exc_info=True)
         raise
 
 
-@router.post("/test-question", response_model=dict)
+@router.post("/test-question")
 async def test_question(
     request: Request,
     current_user: User = Depends(get_current_active_user)
@@ -834,11 +1505,11 @@ async def test_question(
     try:
         # Get raw request body to diagnose validation errors
         raw_body = await request.body()
-        logger.debug(f"Raw test question request body: {raw_body}")
+        logger.debug("Raw test question request body: %s", raw_body)
 
         try:
-            json_body = await request.json()
-            logger.debug(f"JSON test question request body: {json_body}")
+            json_body = orjson.loads(raw_body)
+            logger.debug("JSON test question request body: %s", json_body)
 
             # Extract question for response
             question = json_body.get("question", "No question provided")
@@ -849,20 +1520,21 @@ async def test_question(
 
         # Return data in the expected format for question answering
         logger.info("Returning mock question answer")
-        return {
+        return ORJSONResponse({
             "answer": f"This is a mock answer to your question: '{question}'. In a real implementation, I would analyze the context and provide a detailed response based on the content.",
             "sources": ["Mock source 1", "Mock source 2", "Mock source 3"],
             "conversation_history": []
-        }
+        })
     except Exception as e:
         logger.error(f"Error in test_question: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.debug("Traceback follows", exc_info=True)
         raise
 
 
 @router.post("/question/with-file", response_model=schemas.QuestionResponse)
 async def ask_question_with_file(
     file: UploadFile,
+    background_tasks: BackgroundTasks,
     session_id: str = Form(...),
     question: str = Form(...),
     current_user: User = Depends(get_current_active_user),
@@ -878,13 +1550,13 @@ async def ask_question_with_file(
     logger.info(
         f"Processing question with file upload for session {session_id}")
 
-    # Verify session belongs to user
-    session = db.query(SessionModel).filter(
-        SessionModel.id == session_id,
-        SessionModel.user_id == current_user.id
-    ).first()
-
-    if not session:
+    # Verify session belongs to user and get previous questions and answers
+    # (conversation history) in the same round trip. Questions asked through
+    # this endpoint are stored after the response, so the history cannot
+    # change while the upload is processed.
+    conversation_history = await asyncio.to_thread(
+        _load_owned_session_history, db, int(session_id), current_user.id, 5)
+    if conversation_history is None:
         logger.warning(
             f"Session not found: {session_id} for user {current_user.id}")
         raise HTTPException(
@@ -893,129 +1565,172 @@ async def ask_question_with_file(
         )
 
     # Process file upload first
+    upload_task = None
+    persist_scheduled = False
     try:
-        # Read a small portion of the file to determine its MIME type
-        logger.debug(f"Reading file header: {file.filename}")
-        file_header = await file.read(2048)
-        mime_type = magic.from_buffer(file_header, mime=True)
-
-        # Reset file position after reading the header
-        await file.seek(0)
-        logger.debug(f"File MIME type: {mime_type}")
-
-        # Check if file type is supported
-        if mime_type not in SUPPORTED_MIME_TYPES:
-            logger.warning(f"Unsupported file type: {mime_type}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File type {mime_type} is not supported. Supported types are TXT, CSV, and PDF."
-            )
-
-        # Get file content as bytes
-        content = await file.read()
-        file_size = len(content)
-        logger.debug(f"File size: {file_size} bytes")
-
-        # Map MIME type to file type
-        file_type = MIME_TYPE_TO_FILE_TYPE.get(mime_type, "txt")
-
-        # Parse the file content directly for immediate use
-        logger.debug(f"Parsing file content, type: {file_type}")
-        parsed_content = parse_file_content(content, file_type)
-
-        # Need to reset file to upload to S3
-        with tempfile.NamedTemporaryFile(delete=False) as temp:
-            temp.write(content)
-            temp_path = temp.name
-
-        # Upload file to S3
+        parsed_content, content_hash, chunk_index, upload_task = await _ingest_uploaded_file(
+            file, int(session_id))
+
+        # Check the semantic cache for a near-duplicate question on this
+        # content, earlier in the same conversation
+        cache_scope = _answer_cache_scope(
+            int(session_id), content_hash, conversation_history)
+        question_embedding = None
+        cached_answer = None
         try:
-            s3_key = await upload_file_to_s3(io.BytesIO(
-                content), int(session_id), file.filename)
-            logger.info(f"File uploaded to S3, key: {s3_key}")
-
-            # Create file record in database
-            logger.debug(f"Creating file record in database")
-            new_file = File(
-                session_id=session_id,
-                filename=file.filename,
-                file_type=file_type,
-                s3_key=s3_key,
-                file_size=file_size
-            )
-
-            db.add(new_file)
-            db.commit()
-            db.refresh(new_file)
-            logger.info(f"File record created, ID: {new_file.id}")
+            question_embedding = await asyncio.to_thread(_answer_cache.embed, question)
+            cached_answer = _answer_cache.lookup(question_embedding, cache_scope)
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed: {str(e)}")
 
-            # Store file content
-            file_content = FileContent(
-                file_id=new_file.id,
-                content=parsed_content
-            )
-            db.add(file_content)
-            db.commit()
-            logger.info("File content stored successfully")
+        if cached_answer is not None:
+            logger.info("Answer served from semantic cache")
+            answer_text, sources = cached_answer
+        else:
+            # Analyze using the parsed content immediately
+            logger.info(
+                f"Processing question with immediate file content: {question[:50]}...")
+            try:
+                answer_text, sources = await _answer_question_limited(
+                    int(session_id),
+                    question,
+                    _select_context(parsed_content, chunk_index, question_embedding),
+                    conversation_history
+                )
+                logger.info(f"Question answered")
+                if question_embedding is not None:
+                    _answer_cache.store(
+                        question_embedding, cache_scope, (answer_text, sources))
+            except (RateLimitError, LLMQueueFullError) as e:
+                raise _rate_limited_error(e)
+            except Exception as e:
+                logger.exception(f"Error answering question: {str(e)}")
+                answer_text = f"I encountered an error processing your question about the uploaded content. Error: {str(e)}"
+                sources = []
 
-        except Exception as e:
-            logger.error(f"Error storing file in database: {str(e)}")
-            # Continue with analysis even if file storage fails
-
-        # Get previous questions and answers for this session (conversation history)
-        previous_questions = db.query(Question).filter(
-            Question.session_id == session.id,
-            Question.answer_text.isnot(None)  # Only include answered questions
-        ).order_by(Question.created_at.desc()).limit(5).all()
-
-        # Create conversation history in reverse chronological order (oldest first)
-        conversation_history = [
-            {"question": q.question_text, "answer": q.answer_text}
-            for q in reversed(previous_questions)
-        ]
-
-        # Analyze using the parsed content immediately
-        logger.info(
-            f"Processing question with immediate file content: {question[:50]}...")
-        try:
-            answer_text, sources = answer_question(
-                question,
-                parsed_content,
-                conversation_history
-            )
-            logger.info(f"Question answered")
-        except Exception as e:
-            logger.error(f"Error answering question: {str(e)}")
-            logger.error(traceback.format_exc())
-            answer_text = f"I encountered an error processing your question about the uploaded content. Error: {str(e)}"
-            sources = []
-
-        # Store the question and answer
-        question_record = Question(
-            session_id=session.id,
-            question_text=f"[File: {file.filename}] {question}".strip(),
-            answer_text=answer_text
+        # Store the file, question and answer once the response has been sent
+        background_tasks.add_task(
+            _persist_qa_after_upload,
+            upload_task,
+            int(session_id),
+            f"[File: {file.filename}] {question}".strip(),
+            answer_text
         )
-        db.add(question_record)
-        db.commit()
-        logger.debug(f"Question and answer stored in database")
+        persist_scheduled = True
 
         return {
             "answer": answer_text,
             "sources": sources,
-            "conversation_history": conversation_history
+            "conversation_history": _history_as_dicts(conversation_history)
         }
 
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
     except Exception as e:
-        logger.error(f"Error processing question with file: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error processing question with file: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing question with file: {str(e)}"
         )
+    finally:
+        # Error responses do not run background tasks. The upload has already
+        # started, so store the file even though the question failed.
+        if upload_task is not None and not persist_scheduled:
+            _schedule_persist_qa_after_upload(
+                upload_task, int(session_id), None, None)
+
+@router.post("/question/with-file/stream")
+async def stream_question_with_file(
+    file: UploadFile,
+    session_id: str = Form(...),
+    question: str = Form(...),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream the answer to a question about an uploaded file.
+
+    This endpoint is similar to /question/with-file but streams the answer as
+    Server-Sent Events. Each token is sent as a `data: {"delta": ...}` event,
+    followed by a final `event: done` carrying the sources.
+    """
+    logger.info(
+        f"Processing streaming question with file upload for session {session_id}")
+
+    # Verify session belongs to user and get the conversation history
+    conversation_history = await asyncio.to_thread(
+        _load_owned_session_history, db, int(session_id), current_user.id, 5)
+    if conversation_history is None:
+        logger.warning(
+            f"Session not found: {session_id} for user {current_user.id}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+
+    upload_task = None
+    context = None
+    try:
+        parsed_content, _, chunk_index, upload_task = await _ingest_uploaded_file(
+            file, int(session_id))
+
+        # Long documents are answered from their most relevant chunks
+        question_embedding = None
+        if chunk_index is not None:
+            question_embedding = await asyncio.to_thread(_answer_cache.embed, question)
+        context = _select_context(parsed_content, chunk_index, question_embedding)
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        logger.exception(f"Error processing file for streaming question: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing question with file: {str(e)}"
+        )
+    finally:
+        # The stream never starts, so store the file without an answer
+        if upload_task is not None and context is None:
+            _schedule_persist_qa_after_upload(
+                upload_task, int(session_id), None, None)
+
+    async def event_stream():
+        answer_parts = []
+        try:
+            try:
+                async for token in _coalesce_tokens(_answer_question_stream_limited(
+                    int(session_id),
+                    question,
+                    context,
+                    conversation_history
+                )):
+                    answer_parts.append(token)
+                    yield b"data: " + orjson.dumps({"delta": token}) + b"\n\n"
+            except Exception as e:
+                logger.error(f"Error streaming answer: {str(e)}")
+                error_msg = f"Error: {str(e)}"
+                answer_parts = [error_msg]
+                yield b"data: " + orjson.dumps({"delta": error_msg}) + b"\n\n"
+
+            yield b"event: done\ndata: " + orjson.dumps({"sources": []}) + b"\n\n"
+        finally:
+            # Store the file, question and answer once the stream ends. This
+            # also runs if the client disconnects mid-stream, when background
+            # tasks are skipped, keeping whatever part of the answer was sent.
+            _schedule_persist_qa_after_upload(
+                upload_task,
+                int(session_id),
+                f"[File: {file.filename}] {question}".strip(),
+                "".join(answer_parts) or None
+            )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
 
 @router.post("/question/visualize")
 async def visualize_question(
@@ -1046,12 +1761,7 @@ async def visualize_question(
     logger.info(f"Processing visualization question for session {session_id}")
 
     # Verify session belongs to user
-    session = db.query(SessionModel).filter(
-        SessionModel.id == session_id,
-        SessionModel.user_id == current_user.id
-    ).first()
-
-    if not session:
+    if not await asyncio.to_thread(user_owns_session, db, int(session_id), current_user.id):
         logger.warning(
             f"Session not found: {session_id} for user {current_user.id}")
         raise HTTPException(
@@ -1069,8 +1779,8 @@ async def visualize_question(
 
     # Parse json of chart_data
     try:
-        chart_data = json.loads(chart_data)
-    except json.JSONDecodeError as e:
+        chart_data = orjson.loads(chart_data)
+    except orjson.JSONDecodeError as e:
         logger.error(f"Invalid JSON for chart_data: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1078,27 +1788,26 @@ async def visualize_question(
         )
 
     # Create a new Question record for the visualization
-    question_record = Question(
-        session_id=session.id,
-        question_text=question,
-        answer_text= answer_text,  # Store chart data as answer text
-        chart_data=chart_data,  # Store chart data
-        chart_type=chart_type  # Store chart type
+    question_record = await asyncio.to_thread(
+        _persist_visualization_question,
+        db,
+        int(session_id),
+        question,
+        answer_text,
+        chart_data,
+        chart_type
     )
-    db.add(question_record)
-    db.commit()
-    db.refresh(question_record)
 
     logger.info(f"Visualization question saved with ID: {question_record.id}")
 
-    return {
+    return ORJSONResponse({
         "message": "Visualization question saved successfully",
         "question_id": question_record.id,
         "question_text": question_record.question_text,
         "answer_text": question_record.answer_text,
         "chart_data": question_record.chart_data,
         "chart_type": question_record.chart_type
-    }
+    })
 
 
 
@@ -1121,12 +1830,7 @@ async def visualize_last_file(
         f"Processing question with visualization")
 
     # # Verify session belongs to user
-    session = db.query(SessionModel).filter(
-        SessionModel.id == session_id,
-        SessionModel.user_id == current_user.id
-    ).first()
-
-    if not session:
+    if not await asyncio.to_thread(user_owns_session, db, int(session_id), current_user.id):
         logger.warning(
             f"Session not found: {session_id} for user {current_user.id}")
         raise HTTPException(
@@ -1136,45 +1840,47 @@ async def visualize_last_file(
 
     try:
         #* Get last file in session
-        last_file = db.query(File).filter(
-            File.session_id == session.id
-        ).order_by(File.created_at.desc()).first()
-        last_file_contents = db.query(FileContent).filter(
-            FileContent.file_id == last_file.id
-        ).first()
+        last_file = await asyncio.to_thread(
+            _load_last_file_content, db, int(session_id))
         if not last_file:
             logger.warning(
-                f"No files found in session {session.id} for user {current_user.id}")
+                f"No files found in session {session_id} for user {current_user.id}")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No files found in session"
             )
+        if not last_file.content:
+            logger.warning(
+                f"No content stored for file {last_file.filename} in session {session_id}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No content found for the last file in session"
+            )
         logger.info(
             f"Visualizing file for session")
         try:
             #* Call text analyzer to process the file content
-            analysis_results = await visualize_text(last_file_contents.content)
-
-            # Check if analysis results are valid
-            if not analysis_results:
-                logger.warning(
-                    f"No analysis results found for file {last_file.filename}")
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="No analysis results found for file"
-                )
-            if "overview" not in analysis_results:
-                logger.warning(
-                    f"No overview found in analysis results for file {last_file.filename}")
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="No overview found in analysis results"
-                )
-            logger.info(f"Data visualization completed successfully")
-        except Exception as e:
-            logger.error(f"Error answering question: {str(e)}")
-            logger.error(traceback.format_exc())
+            async with _llm_slot():
+                analysis_results = await visualize_text(last_file.content)
+        except (RateLimitError, LLMQueueFullError) as e:
+            raise _rate_limited_error(e)
 
+        # Check if analysis results are valid
+        if not analysis_results:
+            logger.warning(
+                f"No analysis results found for file {last_file.filename}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No analysis results found for file"
+            )
+        if "overview" not in analysis_results:
+            logger.warning(
+                f"No overview found in analysis results for file {last_file.filename}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No overview found in analysis results"
+            )
+        logger.info(f"Data visualization completed successfully")
 
         # Return the response with visualization
         return analysis_results
@@ -1183,8 +1889,7 @@ async def visualize_last_file(
         # Re-raise HTTP exceptions
         raise
     except Exception as e:
-        logger.error(f"Error processing question with file: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error processing question with file: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing question with file: {str(e)}"
@@ -1,16 +1,150 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File as FastAPIFile, Response
+from fastapi import APIRouter, Depends, Form, HTTPException, status, UploadFile, File as FastAPIFile
+from fastapi.responses import RedirectResponse
+from sqlalchemy import delete, select, update
 from sqlalchemy.orm import Session
-import magic
+import asyncio
+import hmac
 import uuid
+from typing import Tuple
 
 from schemas import schemas
-from core.auth import get_current_active_user, get_password_hash, verify_password
+from core.auth import get_current_active_user, ahash_password, averify_password
 from core.database import get_db
-from models.models import User
-from utils.s3 import upload_file_to_s3
+from models.models import User, Session as SessionModel, File, FileContent, Insight, Emotion, Question
+from utils.s3 import upload_fileobj_to_s3, generate_presigned_url, delete_file_from_s3
+from utils.file_parsers import detect_image_mime_type
+from utils.session_owners import forget_session_owner
+from utils.logger import logger
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+# Lifetime of the presigned URLs profile pictures are redirected to
+PROFILE_PICTURE_URL_EXPIRY_SECONDS = 300
+
+# Profile picture keys are unique per upload, so browsers and CDNs may keep
+# the stored object for a long time
+PROFILE_PICTURE_CACHE_CONTROL = "public, max-age=86400"
+
+
+async def _prepare_profile_picture(file: UploadFile, user_id: int) -> Tuple[str, str]:
+    """
+    Validate an uploaded profile picture and choose its S3 key.
+
+    Args:
+        file: The uploaded image
+        user_id: ID of the user the picture belongs to
+
+    Returns:
+        Tuple of the S3 key to store the picture under and its MIME type
+
+    Raises:
+        HTTPException: If the file is not an image
+    """
+    # The image signature is in the first 12 bytes
+    file_header = await file.read(12)
+    mime_type = detect_image_mime_type(file_header)
+
+    # Reset file position after reading the header
+    await file.seek(0)
+
+    # Check if file type is a supported image
+    if mime_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Uploaded file must be an image (JPEG, PNG, GIF or WebP)"
+        )
+
+    # Generate a unique filename under a specific path for profile pictures,
+    # taking the extension from the detected type rather than the filename
+    file_extension = mime_type.split('/')[-1]
+    s3_key = f"profile_pictures/{user_id}/{uuid.uuid4()}.{file_extension}"
+    return s3_key, mime_type
+
+
+async def _save_profile_picture(db: Session, user: User, file: UploadFile) -> str:
+    """
+    Upload a new profile picture and point the user's profile at it.
+
+    The key is chosen up front, so the profile update is committed while the
+    upload is still streaming to S3. If the upload then fails, the previous
+    picture is restored; if the commit fails, the uploaded object is deleted. The upload is streamed from the request's spooled
+    temporary file, so the image is never read into memory as a whole.
+
+    Args:
+        db: Database session
+        user: The user whose picture is replaced
+        file: The uploaded image
+
+    Returns:
+        The S3 key of the stored picture
+
+    Raises:
+        HTTPException: If the file is not an image or the upload fails
+    """
+    s3_key, mime_type = await _prepare_profile_picture(file, user.id)
+    upload_task = asyncio.create_task(upload_fileobj_to_s3(
+        file.file, s3_key, mime_type, cache_control=PROFILE_PICTURE_CACHE_CONTROL))
+
+    # Store the S3 key in the profile_picture field
+    # The frontend will construct the full URL using this key
+    previous_picture = user.profile_picture
+    user.profile_picture = s3_key
+    try:
+        await asyncio.to_thread(db.commit)
+    except Exception:
+        user.profile_picture = previous_picture
+        await asyncio.to_thread(db.rollback)
+        # The upload runs in a worker thread and cannot be cancelled, so let
+        # it finish before the request's file is closed, then remove the
+        # object nothing points at
+        upload_results = await asyncio.gather(upload_task, return_exceptions=True)
+        if not isinstance(upload_results[0], BaseException):
+            await delete_file_from_s3(s3_key)
+        raise
+
+    try:
+        await upload_task
+    except Exception:
+        user.profile_picture = previous_picture
+        await asyncio.to_thread(db.commit)
+        raise
+
+    return s3_key
+
+
+def _delete_user_and_data(db: Session, user_id: int) -> None:
+    """
+    Delete a user and everything stored under their sessions.
+
+    Each table is cleared with one bulk DELETE, children first, instead of
+    letting the ORM cascade load and delete every row individually. All
+    statements run in a single transaction.
+
+    Args:
+        db: Database session
+        user_id: ID of the user to delete
+    """
+    session_ids = select(SessionModel.id).where(SessionModel.user_id == user_id)
+    file_ids = select(File.id).where(File.session_id.in_(session_ids))
+    insight_ids = select(Insight.id).where(Insight.session_id.in_(session_ids))
+    deleted_session_ids = db.scalars(session_ids).all()
+
+    for statement in (
+        delete(FileContent).where(FileContent.file_id.in_(file_ids)),
+        delete(File).where(File.session_id.in_(session_ids)),
+        delete(Emotion).where(Emotion.insight_id.in_(insight_ids)),
+        delete(Insight).where(Insight.session_id.in_(session_ids)),
+        delete(Question).where(Question.session_id.in_(session_ids)),
+        delete(SessionModel).where(SessionModel.user_id == user_id),
+        delete(User).where(User.id == user_id),
+    ):
+        # The deleted rows are abandoned, so skip syncing the identity map
+        db.execute(statement, execution_options={"synchronize_session": False})
+    db.commit()
+
+    for session_id in deleted_session_ids:
+        forget_session_owner(session_id)
+
 
 @router.get("/me", response_model=schemas.UserResponse)
 async def read_users_me(current_user: User = Depends(get_current_active_user)):
@@ -29,8 +163,8 @@ async def update_user_profile(
     """
     Update user profile information.
     """
-    # Get user from database
-    user = db.query(User).filter(User.id == current_user.id).first()
+    # current_user was loaded in this request's database session
+    user = current_user
 
     # Update fields if provided
     if user_update.full_name is not None:
@@ -41,7 +175,6 @@ async def update_user_profile(
 
     # Save changes
     db.commit()
-    db.refresh(user)
 
     return user
 
@@ -61,44 +194,16 @@ async def update_profile_picture(
     According to FR005 in the PRD: "As an End-User, I want to update my profile picture 
     so that my account reflects my identity."
     """
-    # Get user from database
-    user = db.query(User).filter(User.id == current_user.id).first()
-
-    # Read a small portion of the file to determine its MIME type
-    file_header = await file.read(2048)
-    mime_type = magic.from_buffer(file_header, mime=True)
-
-    # Reset file position after reading the header
-    await file.seek(0)
-
-    # Check if file type is an image
-    if not mime_type.startswith('image/'):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Uploaded file must be an image (JPEG, PNG, etc.)"
-        )
-
-    # Generate a unique filename to prevent collisions
-    file_extension = file.filename.split('.')[-1]
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-
-    # Create a specific path for profile pictures
-    s3_key = f"profile_pictures/{current_user.id}/{unique_filename}"
-    file.filename = s3_key
+    # current_user was loaded in this request's database session
+    user = current_user
 
     try:
-        # Upload profile picture to S3 - await the async function
-        s3_key = await upload_file_to_s3(file, current_user.id)
-
-        # Store the S3 key in the profile_picture field
-        # The frontend will construct the full URL using this key
-        user.profile_picture = s3_key
-
-        # Save changes
-        db.commit()
-        db.refresh(user)
+        await _save_profile_picture(db, user, file)
 
         return user
+    except HTTPException:
+        # Re-raise HTTP exceptions as is
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -107,6 +212,7 @@ async def update_profile_picture(
 
 
 @router.put("/me/password", response_model=schemas.UserResponse)
+@router.post("/change-password", response_model=schemas.UserResponse)
 async def change_password(
     password_update: schemas.PasswordUpdate,
     current_user: User = Depends(get_current_active_user),
@@ -114,50 +220,18 @@ async def change_password(
 ):
     """
     Change user password.
-    """
-    # Get user from database
-    user = db.query(User).filter(User.id == current_user.id).first()
-
-    # Verify current password
-    if not user.hashed_password or not verify_password(password_update.current_password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Incorrect password"
-        )
 
-    # Update password
-    user.hashed_password = get_password_hash(password_update.new_password)
-
-    # Save changes
-    db.commit()
-    db.refresh(user)
-
-    return user
-
-
-@router.post("/change-password", response_model=schemas.UserResponse)
-async def change_password_post(
-    password_update: schemas.PasswordUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
-):
-    """
-    Change user password (POST endpoint for frontend compatibility).
+    Served at both PUT /users/me/password and POST /users/change-password
+    (used by the frontend).
 
     This endpoint provides secure password change functionality with proper validation:
     - Verifies current password before allowing change
     - Enforces password strength requirements
-    - Uses secure bcrypt hashing for storage
+    - Uses secure argon2id hashing for storage
     - Returns minimal error information for security
     """
-    # Get user from database
-    user = db.query(User).filter(User.id == current_user.id).first()
-
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
+    # current_user was loaded in this request's database session
+    user = current_user
     
     # Check if user is authenticated via Google
     if user.google_id:
@@ -166,14 +240,8 @@ async def change_password_post(
             detail="Cannot change password for Google authenticated users"
         )
     
-    # Verify current password
-    if not user.hashed_password or not verify_password(password_update.current_password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Current password is incorrect"
-        )
-
-    # Validate new password strength
+    # Validate new password strength first, so weak passwords are rejected
+    # without paying for a password hash verification
     new_password = password_update.new_password
 
     # Basic password validation
@@ -183,68 +251,80 @@ async def change_password_post(
             detail="Password must be at least 8 characters long"
         )
 
-    # Check for at least one uppercase letter
-    if not any(c.isupper() for c in new_password):
+    # Look for an uppercase letter, a lowercase letter and a digit in a
+    # single pass, stopping as soon as all three have been seen
+    has_upper = has_lower = has_digit = False
+    for c in new_password:
+        if c.isupper():
+            has_upper = True
+        elif c.islower():
+            has_lower = True
+        elif c.isdigit():
+            has_digit = True
+        if has_upper and has_lower and has_digit:
+            break
+
+    if not has_upper:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password must contain at least one uppercase letter"
         )
 
-    # Check for at least one lowercase letter
-    if not any(c.islower() for c in new_password):
+    if not has_lower:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password must contain at least one lowercase letter"
         )
 
-    # Check for at least one digit
-    if not any(c.isdigit() for c in new_password):
+    if not has_digit:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password must contain at least one number"
         )
 
-    # Ensure new password is different from current password
-    if verify_password(new_password, user.hashed_password):
+    # Verify current password
+    if not user.hashed_password or not await averify_password(password_update.current_password, user.hashed_password):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Current password is incorrect"
+        )
+
+    # Ensure new password is different from current password. The current
+    # password was just verified, so comparing the plaintexts replaces a
+    # second hash verification against the stored hash.
+    if hmac.compare_digest(new_password.encode(), password_update.current_password.encode()):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="New password must be different from current password"
         )
 
-    # Update password with secure hashing
-    user.hashed_password = get_password_hash(new_password)
+    # Update password with secure hashing. The UPDATE only matches while the
+    # stored hash is the one verified above, so of two concurrent changes
+    # only the first succeeds.
+    new_hash = await ahash_password(new_password)
+    result = db.execute(
+        update(User)
+        .where(User.id == user.id, User.hashed_password == user.hashed_password)
+        .values(hashed_password=new_hash)
+    )
+    if result.rowcount == 0:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Password was changed concurrently"
+        )
 
-    # Save changes
+    # Save changes. The bulk UPDATE bypasses the unit of work, so only the
+    # database-set updated_at has to be reloaded.
     db.commit()
-    db.refresh(user)
+    db.refresh(user, attribute_names=["updated_at"])
 
     # Log successful password change (without sensitive data)
-    from utils.logger import logger
     logger.info(f"Password changed successfully for user ID: {user.id}")
 
     return user
 
 
-@router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user_account(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
-):
-    """
-    Delete user account and all associated data.
-    """
-    # Get user from database
-    user = db.query(User).filter(User.id == current_user.id).first()
-
-    # Delete user (cascade will delete associated sessions, files, insights, and questions)
-    db.delete(user)
-    db.commit()
-
-    return None
-
-
-from fastapi import Form
-
 @router.patch("/profile", response_model=schemas.UserResponse)
 async def update_user_profile_patch(
     current_user: User = Depends(get_current_active_user),
@@ -258,12 +338,8 @@ async def update_user_profile_patch(
     This endpoint allows updating profile information by sending form data,
     supporting partial updates of profile details and file uploads.
     """
-    # Set up logging
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    # Get user from database
-    user = db.query(User).filter(User.id == current_user.id).first()
+    # current_user was loaded in this request's database session
+    user = current_user
     
     # Enhanced debugging logs
     logger.info(f"DEBUG - Updating user profile for user_id={current_user.id}")
@@ -277,45 +353,16 @@ async def update_user_profile_patch(
     else:
         logger.info("DEBUG - No profile picture received")
 
-    # Update full name if provided
-    if full_name:
-        user.full_name = full_name
-        logger.info(f"Updated full_name to: {full_name}")
-
-    # Update profile picture if provided
+    # Update profile picture if provided. This is done before the name so
+    # that a failed upload leaves the whole profile unchanged.
     if profile_picture:
         try:
-            # Read a small portion of the file to determine its MIME type
-            file_header = await profile_picture.read(2048)
-            mime_type = magic.from_buffer(file_header, mime=True)
-            logger.info(f"Detected MIME type: {mime_type}")
-
-            # Reset file position after reading the header
-            await profile_picture.seek(0)
-
-            # Check if file type is an image
-            if not mime_type.startswith('image/'):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Uploaded file must be an image (JPEG, PNG, etc.)"
-                )
-
-            # Generate a unique filename to prevent collisions
-            file_extension = profile_picture.filename.split('.')[-1]
-            unique_filename = f"{uuid.uuid4()}.{file_extension}"
-
-            # Create a specific path for profile pictures
-            s3_key = f"profile_pictures/{current_user.id}/{unique_filename}"
-            profile_picture.filename = s3_key
-
-            # Upload profile picture to S3 - await the async function
-            s3_key = await upload_file_to_s3(profile_picture, current_user.id)
-            logger.info(f"S3 key after upload: {s3_key}")
-            
-            # Update the user's profile picture URL
-            user.profile_picture = s3_key
-            logger.info(f"Updated user profile_picture to: {user.profile_picture}")
+            s3_key = await _save_profile_picture(db, user, profile_picture)
+            logger.info(f"Updated user profile_picture to: {s3_key}")
 
+        except HTTPException:
+            # Re-raise HTTP exceptions as is
+            raise
         except Exception as e:
             logger.error(f"Failed to upload profile picture: {str(e)}", exc_info=True)
             raise HTTPException(
@@ -323,9 +370,13 @@ async def update_user_profile_patch(
                 detail=f"Failed to upload profile picture: {str(e)}"
             )
 
+    # Update full name if provided
+    if full_name:
+        user.full_name = full_name
+        logger.info(f"Updated full_name to: {full_name}")
+
     # Save changes
     db.commit()
-    db.refresh(user)
 
     return user
 
@@ -334,34 +385,27 @@ async def update_user_profile_patch(
 async def get_profile_picture(s3_key: str):
     """
     Serve a profile picture from S3.
-    
-    This endpoint retrieves a profile picture from S3 and serves it directly.
-    The s3_key is the path to the file in S3.
+
+    This endpoint redirects to a short-lived presigned S3 URL, so the image
+    is downloaded by the client straight from S3 rather than through this
+    server. The s3_key is the path to the file in S3.
     """
-    try:
-        from utils.s3 import get_file_from_s3
-        # Get the file content from S3
-        file_content = await get_file_from_s3(s3_key)
-        
-        # Determine content type (default to JPEG if unknown)
-        content_type = "image/jpeg"
-        if s3_key.lower().endswith(".png"):
-            content_type = "image/png"
-        elif s3_key.lower().endswith(".gif"):
-            content_type = "image/gif"
-        
-        # Return the file content with appropriate headers
-        return Response(
-            content=file_content,
-            media_type=content_type
-        )
-    except Exception as e:
+    url = await generate_presigned_url(s3_key, expiration=PROFILE_PICTURE_URL_EXPIRY_SECONDS)
+    if not url:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Profile picture not found: {str(e)}"
+            detail="Profile picture not found"
         )
 
+    # Let the browser reuse the redirect while the URL is still valid
+    return RedirectResponse(
+        url,
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+        headers={"Cache-Control": f"private, max-age={PROFILE_PICTURE_URL_EXPIRY_SECONDS - 60}"}
+    )
 
+
+@router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
 @router.delete("/profile", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user_account(
     current_user: User = Depends(get_current_active_user),
@@ -373,26 +417,22 @@ async def delete_user_account(
     This endpoint allows users to delete their own account.
     All associated data will be removed from the system.
     """
-    # Get user from database
-    user = db.query(User).filter(User.id == current_user.id).first()
+    # current_user was loaded in this request's database session
+    user = current_user
 
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-
-    # If the user is an admin, check if they are the last admin
+    # If the user is an admin, check that another admin remains. EXISTS
+    # stops at the first match instead of counting every admin.
     if user.is_admin:
-        admin_count = db.query(User).filter(User.is_admin == True).count()
-        if admin_count <= 1:
+        has_other_admin = db.query(
+            db.query(User).filter(User.is_admin == True, User.id != user.id).exists()
+        ).scalar()
+        if not has_other_admin:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Cannot delete the last admin account"
             )
 
     # Delete the user
-    db.delete(user)
-    db.commit()
+    _delete_user_and_data(db, user.id)
 
     return None
@@ -5,7 +5,7 @@ This module provides access to core functionality in the DeepPurple application.
 """
 
 from core.auth import (
-    get_password_hash, verify_password, create_access_token,
+    get_password_hash, verify_password, ahash_password, averify_password, averify_and_update_password, create_access_token,
     get_current_user, get_current_active_user, get_current_admin_user, verify_google_token
 )
 from core.config import settings
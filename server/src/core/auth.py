@@ -1,6 +1,12 @@
+import asyncio
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+from typing import Dict, Optional, Tuple
+import jwt
+from jwt import PyJWTError
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -14,14 +20,43 @@ from models.models import User
 from schemas.schemas import TokenData
 from utils.logger import logger
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. New hashes use argon2id; bcrypt stays so existing
+# hashes still verify, and they are upgraded on the user's next login.
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__memory_cost=19456,
+    argon2__rounds=2,
+    argon2__parallelism=1,
+)
+# Load the hashing backends now rather than on the first login
+for _scheme in pwd_context.schemes():
+    pwd_context.handler(_scheme).get_backend()
+
+# Password hashing is CPU bound and releases the GIL, so it runs on its own
+# threads, one per core, instead of blocking the event loop
+_password_executor = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1, thread_name_prefix="password-hash")
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
-# In-memory token blacklist (for simplicity; use Redis or DB in production)
-token_blacklist = set()
+# In-memory token blacklist (for simplicity; use Redis or DB in production).
+# Maps the SHA-256 digest of each revoked token to the time it expires, so
+# raw JWTs are not kept and entries are dropped once the token is unusable.
+token_blacklist: Dict[bytes, float] = {}
+
+
+# Digests of verified tokens mapped to (user ID, expiry time), so a token
+# reused across requests is not decoded and its signature re-checked every time
+TOKEN_CACHE_MAX_SIZE = 4096
+_token_cache: Dict[bytes, Tuple[int, float]] = {}
+
+
+def _token_digest(token: str) -> bytes:
+    """Return the key a token is stored under in the blacklist and token cache."""
+    return hashlib.sha256(token.encode()).digest()
 
 
 def add_token_to_blacklist(token: str):
@@ -30,12 +65,25 @@ def add_token_to_blacklist(token: str):
 
     This function adds a JWT token to an in-memory blacklist, effectively
     invalidating it for future authentication attempts. This is used during
-    logout to revoke access.
+    logout to revoke access. Tokens that have since expired are pruned at
+    the same time, since they are rejected anyway.
 
     Args:
         token: The JWT token to blacklist
     """
-    token_blacklist.add(token)
+    now = time.time()
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+        expires_at = float(claims["exp"])
+    except (PyJWTError, KeyError, TypeError, ValueError):
+        expires_at = now + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+    for digest in [d for d, exp in token_blacklist.items() if exp <= now]:
+        del token_blacklist[digest]
+
+    digest = _token_digest(token)
+    token_blacklist[digest] = expires_at
+    _token_cache.pop(digest, None)
 
 
 def is_token_blacklisted(token: str) -> bool:
@@ -51,7 +99,7 @@ def is_token_blacklisted(token: str) -> bool:
     Returns:
         bool: True if the token is blacklisted, False otherwise
     """
-    return token in token_blacklist
+    return _token_digest(token) in token_blacklist
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -59,7 +107,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Verify a password against a hash.
 
     This function checks if a plaintext password matches a previously hashed
-    password using the configured hashing algorithm (bcrypt).
+    password using the scheme the hash was created with (argon2 or bcrypt).
 
     Args:
         plain_password: The plaintext password to verify
@@ -76,7 +124,7 @@ def get_password_hash(password: str) -> str:
     Hash a password for storing.
 
     This function creates a secure hash of a plaintext password using the
-    configured hashing algorithm (bcrypt) for safe storage in the database.
+    configured hashing algorithm (argon2id) for safe storage in the database.
 
     Args:
         password: The plaintext password to hash
@@ -87,6 +135,56 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify a password against a hash without blocking the event loop.
+
+    Args:
+        plain_password: The plaintext password to verify
+        hashed_password: The hashed password to compare against
+
+    Returns:
+        bool: True if the password matches, False otherwise
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_executor, verify_password, plain_password, hashed_password)
+
+
+async def averify_and_update_password(
+    plain_password: str,
+    hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and rehash it if its hash uses a deprecated scheme.
+
+    Args:
+        plain_password: The plaintext password to verify
+        hashed_password: The hashed password to compare against
+
+    Returns:
+        Tuple of whether the password matches and, if the stored hash should
+        be replaced, the new hash (None otherwise)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_executor, pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def ahash_password(password: str) -> str:
+    """
+    Hash a password for storing without blocking the event loop.
+
+    Args:
+        password: The plaintext password to hash
+
+    Returns:
+        str: The hashed password
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT token with an optional expiration time.
@@ -139,23 +237,42 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    if is_token_blacklisted(token):
+    # A JWT is three dot-separated segments; reject anything else before
+    # hashing it for the blacklist or verifying its signature
+    if token.count(".") != 2:
+        raise credentials_exception
+
+    # The digest keys both the blacklist and the verified-token cache
+    digest = _token_digest(token)
+    if digest in token_blacklist:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has been revoked (logged out)",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    try:
-        # Decode the JWT token
-        payload = jwt.decode(token, settings.SECRET_KEY,
-                             algorithms=[settings.ALGORITHM])
-        user_id: Optional[int] = payload.get("sub")
-        if user_id is None:
+    cached = _token_cache.get(digest)
+    if cached is not None and cached[1] > time.time():
+        token_data = TokenData(user_id=cached[0])
+    else:
+        try:
+            # Decode the JWT token
+            payload = jwt.decode(token, settings.SECRET_KEY,
+                                 algorithms=[settings.ALGORITHM],
+                                 options={"require": ["exp", "sub"]})
+            user_id: Optional[int] = payload.get("sub")
+            if user_id is None:
+                raise credentials_exception
+            token_data = TokenData(user_id=int(user_id))
+        except PyJWTError:
             raise credentials_exception
-        token_data = TokenData(user_id=int(user_id))
-    except JWTError:
-        raise credentials_exception
+
+        if len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+            _token_cache.pop(next(iter(_token_cache)), None)
+        # exp is always set by create_access_token; without it, skip caching
+        expires_at = float(payload.get("exp") or 0)
+        if expires_at > time.time():
+            _token_cache[digest] = (token_data.user_id, expires_at)
 
     # Get the user from the database
     user = db.query(User).filter(User.id == token_data.user_id).first()
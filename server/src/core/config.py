@@ -1,9 +1,15 @@
 import os
-from pydantic_settings import BaseSettings
+from dataclasses import dataclass
+from dotenv import load_dotenv
 from typing import List, Optional
 
+# Fill in anything not set in the real environment from a local .env file,
+# before the defaults below are read
+load_dotenv(".env", encoding="utf-8")
 
-class Settings(BaseSettings):
+
+@dataclass(frozen=True, slots=True)
+class Settings:
     """Application settings configuration.
 
     This class defines all settings used by the application. Values can be set
@@ -11,11 +17,12 @@ class Settings(BaseSettings):
     environment variable `DATABASE_URL`.
 
     For security-sensitive values, they can also be loaded from a .env file
-    which should be kept out of version control.
+    which should be kept out of version control. Every value is read from the
+    environment exactly once, when this module is imported.
     """
     # App settings
-    APP_NAME: str = "DeepPurple"
-    APP_VERSION: str = "0.1.0"
+    APP_NAME: str = os.getenv("APP_NAME", "DeepPurple")
+    APP_VERSION: str = os.getenv("APP_VERSION", "0.1.0")
     DEBUG: bool = os.getenv("DEBUG", "false").lower() in ("true", "1", "t")
 
     # Deployment environment
@@ -25,8 +32,9 @@ class Settings(BaseSettings):
     # Security settings
     SECRET_KEY: str = os.getenv(
         "SECRET_KEY", "your-super-secret-key-change-this-in-production")
-    ALGORITHM: str = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(
+        os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
     # Database settings
     USE_SQLITE: bool = os.getenv(
@@ -37,6 +45,12 @@ class Settings(BaseSettings):
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "")
     DB_NAME: str = os.getenv("DB_NAME", "deeppurple")
     DB_PORT: str = os.getenv("DB_PORT", "5432")
+    # Connection pool sizing. Requests hold a connection while waiting on
+    # multi-second LLM calls, so the pool is sized well above the default.
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "5"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
 
     # AWS settings
     AWS_ACCESS_KEY_ID: str = os.getenv("AWS_ACCESS_KEY_ID", "")
@@ -54,16 +68,26 @@ class Settings(BaseSettings):
 
     # OpenAI settings
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    # Maximum number of concurrent OpenAI requests per worker process
+    OPENAI_MAX_CONCURRENCY: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", "32"))
+    # Minimum cosine similarity for reusing a cached answer to a similar question
+    SEMANTIC_CACHE_THRESHOLD: float = float(
+        os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    # Minimum cosine similarity for reusing the analysis of a similar text
+    ANALYSIS_CACHE_THRESHOLD: float = float(
+        os.getenv("ANALYSIS_CACHE_THRESHOLD", "0.92"))
+    # Largest file accepted by the upload endpoints, in bytes
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+    # SQLite file that keeps file analyses across restarts
+    ANALYSIS_STORE_PATH: str = os.getenv(
+        "ANALYSIS_STORE_PATH", "./analysis_cache.db")
+    # Most file analyses kept in that file; the oldest are deleted first
+    ANALYSIS_STORE_MAX_ENTRIES: int = int(
+        os.getenv("ANALYSIS_STORE_MAX_ENTRIES", "10000"))
 
     # Google settings
     GOOGLE_CLIENT_ID: str = os.getenv("GOOGLE_CLIENT_ID", "")
 
-    class Config:
-        """Pydantic settings configuration."""
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-        extra = "allow"  # Allow extra fields in the settings
-
 
 # Create settings instance that will be imported from this module
 settings = Settings()
@@ -5,9 +5,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from core.config import settings
-from core.database import engine, Base, SQLALCHEMY_DATABASE_URL, get_db
+from core.database import engine, health_engine, Base, SQLALCHEMY_DATABASE_URL, get_db
 from api import auth, users, sessions, files, analysis, admin
 from utils.admin import create_admin_user
+from utils.s3 import get_async_s3_client, close_async_s3_client
 from utils.logger import logger
 from core.auth import get_password_hash
 from models.models import User
@@ -45,9 +46,16 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Error during database initialization: {str(e)}")
 
+    try:
+        # Open the S3 client shared by async uploads
+        await get_async_s3_client()
+    except Exception as e:
+        logger.error(f"Error opening S3 client: {str(e)}")
+
     yield
-    # Clean up resources at shutdown if needed
-    pass
+
+    # Clean up resources at shutdown
+    await close_async_s3_client()
 
 # Initialize FastAPI app with appropriate configuration for Elastic Beanstalk
 root_path = "" if not settings.API_BASE_URL else settings.API_BASE_URL
@@ -173,9 +181,10 @@ async def health_check():
     """
     # Check if database is connected
     try:
-        # Try a simple query
-        with engine.connect() as connection:
-            connection.execute("SELECT 1")
+        # Try a simple query. exec_driver_sql sends it as-is, skipping
+        # SQL compilation on every probe.
+        with health_engine.connect() as connection:
+            connection.exec_driver_sql("SELECT 1")
         db_status = "connected"
     except Exception as e:
         db_status = f"error: {str(e)}"
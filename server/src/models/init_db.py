@@ -6,7 +6,7 @@ Run this script after setting up the RDS instance to initialize the schema.
 """
 
 from models.models import Base
-from core.database import engine
+from core.database import create_unpooled_engine
 import sys
 import os
 import logging
@@ -24,7 +24,7 @@ def init_db():
     """Initialize the database by creating all tables."""
     try:
         logger.info("Creating database tables...")
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=create_unpooled_engine())
         logger.info("Database tables created successfully.")
     except Exception as e:
         logger.error(f"Error creating database tables: {str(e)}")
@@ -4,7 +4,7 @@ Database migration script.
 This script adds the user_tier column to the users table for existing databases.
 """
 
-from core.database import engine
+from core.database import create_unpooled_engine
 import sys
 import os
 import logging
@@ -41,17 +41,38 @@ def check_and_add_column(conn, table_name, column_name, column_type):
         return False
 
 
+def create_index_if_missing(conn, index_name, table_name, columns, where=None):
+    """Create an index, partial if a WHERE clause is given, if it doesn't already exist."""
+    logger.info(f"Ensuring index {index_name} exists on {table_name}...")
+    where_clause = f"WHERE {where}" if where else ""
+    conn.execute(text(f"""
+        CREATE INDEX IF NOT EXISTS {index_name}
+        ON {table_name} ({columns}) {where_clause};
+    """))
+    conn.commit()
+
+
 def migrate_db():
     """Run database migrations."""
     try:
         logger.info("Starting database migration...")
-        with engine.connect() as conn:
+        with create_unpooled_engine().connect() as conn:
             # Migrate users table
             check_and_add_column(conn, 'users', 'user_tier', "VARCHAR(50) DEFAULT 'basic' NOT NULL")
             
             # Migrate questions table
             check_and_add_column(conn, 'questions', 'chart_data', 'JSON')
             check_and_add_column(conn, 'questions', 'chart_type', 'VARCHAR(50)')
+
+            # Index for recent conversation history lookups
+            create_index_if_missing(conn, 'ix_question_session_id_desc', 'questions', 'session_id, id DESC')
+            # Partial index for last-admin checks
+            create_index_if_missing(conn, 'ix_users_admin_id', 'users', 'id', where='is_admin')
+            # Indexes for per-user and per-session listings
+            create_index_if_missing(conn, 'ix_sessions_user_archived_created', 'sessions', 'user_id, is_archived, created_at')
+            create_index_if_missing(conn, 'ix_files_session_created', 'files', 'session_id, created_at')
+            create_index_if_missing(conn, 'ix_insights_session_created', 'insights', 'session_id, created_at')
+            create_index_if_missing(conn, 'ix_emotions_insight_id', 'emotions', 'insight_id')
             
             logger.info("Database migration completed successfully.")
             
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, Float, JSON
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, Float, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -48,6 +48,15 @@ class User(Base):
     sessions = relationship(
         "Session", back_populates="user", cascade="all, delete-orphan")
 
+    # Last-admin checks only look at admin rows, so index just those
+    __table_args__ = (
+        Index("ix_users_admin_id", "id",
+              postgresql_where=is_admin, sqlite_where=is_admin),
+    )
+
+    # Fetch updated_at with the UPDATE itself so saved users need no refresh
+    __mapper_args__ = {"eager_defaults": True}
+
 
 class Session(Base):
     """
@@ -89,6 +98,12 @@ class Session(Base):
     questions = relationship(
         "Question", back_populates="session", cascade="all, delete-orphan")
 
+    # Session lists filter by owner and archive status, newest first
+    __table_args__ = (
+        Index("ix_sessions_user_archived_created",
+              "user_id", "is_archived", "created_at"),
+    )
+
     # Helper methods
     def get_all_file_contents(self):
         """Get all file contents for this session using direct relationship navigation.
@@ -141,6 +156,11 @@ class File(Base):
     contents = relationship("FileContent", back_populates="file",
                             cascade="all, delete-orphan", uselist=False)
 
+    # Also serves plain lookups by session_id, the leading column
+    __table_args__ = (
+        Index("ix_files_session_created", "session_id", "created_at"),
+    )
+
 
 class FileContent(Base):
     """
@@ -202,6 +222,11 @@ class Insight(Base):
     # Relationships
     session = relationship("Session", back_populates="insights")
 
+    # Insight lists are per session, newest first
+    __table_args__ = (
+        Index("ix_insights_session_created", "session_id", "created_at"),
+    )
+
 
 class Emotion(Base):
     """
@@ -223,7 +248,8 @@ class Emotion(Base):
     __tablename__ = "emotions"
 
     id = Column(Integer, primary_key=True, index=True)
-    insight_id = Column(Integer, ForeignKey("insights.id"), nullable=False)
+    insight_id = Column(Integer, ForeignKey("insights.id"),
+                        nullable=False, index=True)
     # joy, sadness, anger, etc.
     emotion_type = Column(String(50), nullable=False)
     score = Column(Float, nullable=False)  # 0-1 confidence score
@@ -264,3 +290,8 @@ class Question(Base):
 
     # Relationships
     session = relationship("Session", back_populates="questions")
+
+    # Recent-history lookups walk this index backwards instead of sorting
+    __table_args__ = (
+        Index("ix_question_session_id_desc", "session_id", id.desc()),
+    )
@@ -7,7 +7,7 @@ This module provides various utility functions for the DeepPurple application.
 from utils.logger import logger
 from utils.text_analyzer import analyze_text, answer_question
 from utils.file_parsers import parse_file_content
-from utils.s3 import upload_file_to_s3, get_file_from_s3, delete_file_from_s3, generate_presigned_url
+from utils.s3 import upload_file_to_s3, upload_fileobj_to_s3, get_file_from_s3, delete_file_from_s3, generate_presigned_url
 
 __all__ = [
     'logger',
@@ -15,6 +15,7 @@ __all__ = [
     'answer_question',
     'parse_file_content',
     'upload_file_to_s3',
+    'upload_fileobj_to_s3',
     'get_file_from_s3',
     'delete_file_from_s3',
     'generate_presigned_url'
@@ -0,0 +1,100 @@
+"""
+Analysis Cache Utilities
+
+This module provides an in-process cache for text analysis results. Texts
+are matched exactly first and then by embedding similarity, so resubmitting
+the same or a near-identical text skips the LLM call.
+"""
+
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.semantic_cache import SemanticAnswerCache, content_fingerprint, normalize_question
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# All analyses share one similarity bucket; they are not tied to a context
+_ANALYSIS_BUCKET = "analysis"
+
+
+class AnalysisCache:
+    """
+    Two-level cache of analysis results.
+
+    Exact matches on the normalized text are checked first without any
+    network call. On a miss the text is embedded and compared against
+    previously analyzed texts; results are returned when the cosine
+    similarity meets the threshold.
+
+    The cache is thread-safe so it can be used from worker threads.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        max_entries: int = 1024,
+        embedder: Optional[Callable[[str], List[float]]] = None
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a semantic hit
+            max_entries: Maximum number of cached results at each level
+            embedder: Optional function mapping text to an embedding vector
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._exact: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._semantic = SemanticAnswerCache(threshold, max_entries, embedder)
+
+    def get(self, text: str) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """
+        Look up a cached analysis for a text.
+
+        Args:
+            text: The text to look up
+
+        Returns:
+            Tuple of (a copy of the cached result or None, the text embedding
+            if one was computed so it can be passed to set())
+        """
+        key = content_fingerprint(normalize_question(text))
+        with self._lock:
+            result = self._exact.get(key)
+            if result is not None:
+                self._exact.move_to_end(key)
+                return copy.deepcopy(result), None
+
+        embedding = self._semantic.embed(text)
+        result = self._semantic.lookup(embedding, _ANALYSIS_BUCKET)
+        if result is not None:
+            logger.debug("Semantic analysis cache hit")
+            return copy.deepcopy(result), embedding
+        return None, embedding
+
+    def set(self, text: str, result: Dict[str, Any], embedding: Optional[np.ndarray] = None) -> None:
+        """
+        Cache the analysis of a text.
+
+        Args:
+            text: The analyzed text
+            result: The analysis result
+            embedding: The text embedding returned by get(), if any
+        """
+        result = copy.deepcopy(result)
+        key = content_fingerprint(normalize_question(text))
+        with self._lock:
+            self._exact[key] = result
+            if len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+
+        if embedding is None:
+            embedding = self._semantic.embed(text)
+        self._semantic.store(embedding, _ANALYSIS_BUCKET, result)
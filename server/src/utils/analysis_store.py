@@ -0,0 +1,108 @@
+"""
+Analysis Store Utilities
+
+This module provides a small SQLite-backed store for analysis results so
+re-analyzing an unchanged file is served from disk, even after a restart.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import orjson
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class AnalysisStore:
+    """
+    Persistent key-value store of analysis results.
+
+    Results are serialized with orjson and kept in a single SQLite table in
+    WAL mode. One connection is shared by all threads behind a lock. The
+    database is opened on first use, so an unwritable path only makes store
+    calls fail instead of breaking the import of the caller. Once the store
+    holds more than max_entries results, the oldest are deleted on write.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        """
+        Initialize the store without opening the database.
+
+        Args:
+            path: Path of the SQLite database file
+            max_entries: Maximum number of stored results
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Open (and create if needed) the database. Must be called with the lock held.
+
+        Returns:
+            The shared SQLite connection
+        """
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS analyze_cache ("
+                    "key TEXT PRIMARY KEY, result BLOB NOT NULL, created_at INTEGER NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS ix_analyze_cache_created_at "
+                    "ON analyze_cache (created_at)"
+                )
+                conn.commit()
+            except Exception:
+                conn.close()
+                raise
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a stored analysis.
+
+        Args:
+            key: The cache key
+
+        Returns:
+            The stored result, or None if there is none
+        """
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT result FROM analyze_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return orjson.loads(row[0])
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        """
+        Store an analysis, replacing any previous result for the key, and
+        delete the oldest results beyond max_entries.
+
+        Args:
+            key: The cache key
+            result: The analysis result
+        """
+        payload = orjson.dumps(result)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO analyze_cache (key, result, created_at) VALUES (?, ?, ?)",
+                (key, payload, int(time.time()))
+            )
+            conn.execute(
+                "DELETE FROM analyze_cache WHERE key IN ("
+                "SELECT key FROM analyze_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            conn.commit()
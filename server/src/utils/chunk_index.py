@@ -0,0 +1,108 @@
+"""
+Chunk Index Utilities
+
+This module splits long documents into overlapping chunks, embeds them once
+and retrieves the chunks most relevant to a question, so only those chunks
+need to be sent to the LLM.
+"""
+
+import logging
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from utils.semantic_cache import get_openai_embeddings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def chunk_text(text: str, chunk_size: int = 1500, overlap: int = 200) -> List[str]:
+    """
+    Split text into overlapping character chunks.
+
+    Args:
+        text: The text to split
+        chunk_size: Maximum number of characters per chunk
+        overlap: Number of characters shared by consecutive chunks
+
+    Returns:
+        List of chunks in document order
+    """
+    if len(text) <= chunk_size:
+        return [text] if text else []
+
+    step = chunk_size - overlap
+    return [text[start:start + chunk_size] for start in range(0, len(text) - overlap, step)]
+
+
+def _default_document_embedder() -> Callable[[List[str]], List[List[float]]]:
+    """Get the OpenAI document embedding function used when none is supplied."""
+    return get_openai_embeddings().embed_documents
+
+
+class ChunkIndex:
+    """
+    In-memory embedding index over the chunks of a single document.
+
+    Embeddings are stored as a normalized matrix, so a search is a single
+    matrix-vector product against a normalized query embedding.
+    """
+
+    def __init__(self, chunks: List[str], embeddings: np.ndarray):
+        """
+        Initialize the index.
+
+        Args:
+            chunks: Document chunks in document order
+            embeddings: Matrix of chunk embeddings, one row per chunk
+        """
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.chunks = chunks
+        self._matrix = embeddings / norms
+
+    def search(self, query_embedding: np.ndarray, k: int = 5) -> List[str]:
+        """
+        Find the chunks most similar to a query.
+
+        Args:
+            query_embedding: Normalized embedding of the query
+            k: Maximum number of chunks to return
+
+        Returns:
+            The best matching chunks, in document order
+        """
+        if not self.chunks:
+            return []
+        similarities = self._matrix @ query_embedding
+        k = min(k, len(self.chunks))
+        best = np.argpartition(-similarities, k - 1)[:k]
+        return [self.chunks[i] for i in sorted(best)]
+
+
+def build_chunk_index(
+    text: str,
+    chunk_size: int = 1500,
+    overlap: int = 200,
+    embed_documents: Optional[Callable[[List[str]], List[List[float]]]] = None
+) -> ChunkIndex:
+    """
+    Chunk and embed a document.
+
+    Args:
+        text: The document text
+        chunk_size: Maximum number of characters per chunk
+        overlap: Number of characters shared by consecutive chunks
+        embed_documents: Optional function mapping texts to embedding vectors
+
+    Returns:
+        ChunkIndex: The index over the document's chunks
+    """
+    if embed_documents is None:
+        embed_documents = _default_document_embedder()
+
+    chunks = chunk_text(text, chunk_size, overlap)
+    embeddings = np.asarray(embed_documents(chunks), dtype=np.float32) if chunks else np.zeros((0, 1), dtype=np.float32)
+    logger.debug(f"Built chunk index with {len(chunks)} chunks")
+    return ChunkIndex(chunks, embeddings)
@@ -9,14 +9,88 @@ import os
 import logging
 import io
 import csv
-import traceback
 import PyPDF2
+import magic
 from fastapi import HTTPException
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
 
+# Leading bytes of the binary formats we accept, checked before libmagic
+_MIME_SIGNATURES = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+# Text formats whose extension is trusted once the header looks like text
+_TEXT_EXTENSION_MIME_TYPES = {
+    "txt": "text/plain",
+    "csv": "text/csv",
+}
+
+# libmagic handle opened once per process, used for everything else
+_MAGIC = magic.Magic(mime=True)
+
+
+def _signature_mime_type(file_header: bytes) -> Optional[str]:
+    """Return the MIME type matching a known leading signature, if any."""
+    for signature, mime_type in _MIME_SIGNATURES:
+        if file_header.startswith(signature):
+            return mime_type
+    if file_header[:4] == b"RIFF" and file_header[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def detect_image_mime_type(file_header: bytes) -> Optional[str]:
+    """
+    Detect a JPEG, PNG, GIF or WebP image from its first bytes.
+
+    Only the leading signature is checked, so the first 12 bytes of the
+    file are enough and libmagic is never consulted.
+
+    Args:
+        file_header: The first bytes of the file
+
+    Returns:
+        The image MIME type, or None if the file is not a supported image
+    """
+    mime_type = _signature_mime_type(file_header)
+    if mime_type is not None and mime_type.startswith("image/"):
+        return mime_type
+    return None
+
+
+def detect_mime_type(file_header: bytes, filename: Optional[str] = None) -> str:
+    """
+    Detect the MIME type of a file from its first bytes.
+
+    PDFs and common image formats are recognised by their signature. Files
+    named .txt or .csv are taken at their word when the header contains no
+    NUL bytes. Everything else is left to libmagic.
+
+    Args:
+        file_header: The first bytes of the file
+        filename: Optional original filename, used for the text fast path
+
+    Returns:
+        str: The detected MIME type
+    """
+    mime_type = _signature_mime_type(file_header)
+    if mime_type is not None:
+        return mime_type
+    if filename and b"\x00" not in file_header:
+        extension = filename.rsplit(".", 1)[-1].lower()
+        mime_type = _TEXT_EXTENSION_MIME_TYPES.get(extension)
+        if mime_type is not None:
+            return mime_type
+    return _MAGIC.from_buffer(file_header)
+
+
 def parse_txt_file(content: bytes) -> str:
     """
     Parse a text file and return its content as a string.
@@ -171,6 +245,5 @@ def parse_file_content(content: bytes, file_type: str) -> str:
             return f"File content extraction not supported for {file_type} files. Please use TXT, CSV, or PDF formats."
 
     except Exception as e:
-        logger.error(f"Error parsing file content: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error parsing file content: {str(e)}")
         return f"Error parsing file: {str(e)}. Please check the file content and try again."
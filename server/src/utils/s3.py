@@ -8,6 +8,8 @@ import os
 import boto3
 import aioboto3
 import asyncio
+from contextlib import AsyncExitStack
+from boto3.exceptions import S3UploadFailedError
 from botocore.exceptions import ClientError
 from fastapi import UploadFile, HTTPException
 import logging
@@ -23,6 +25,13 @@ logger = logging.getLogger(__name__)
 # Global S3 client for reuse
 _s3_client = None
 
+# Global aioboto3 S3 client for async uploads, shared across requests. The
+# client and its lock belong to the event loop that opened them.
+_async_s3_client = None
+_async_s3_exit_stack: Optional[AsyncExitStack] = None
+_async_s3_client_lock: Optional[asyncio.Lock] = None
+_async_s3_loop: Optional[asyncio.AbstractEventLoop] = None
+
 
 def get_s3_client():
     """
@@ -66,6 +75,66 @@ def get_s3_client():
             status_code=500, detail="Failed to connect to S3 storage")
 
 
+async def get_async_s3_client():
+    """
+    Return the shared aioboto3 S3 client, opening it on first use.
+
+    The client is normally opened at application startup and closed at
+    shutdown, so requests reuse its connection pool instead of creating a
+    session and client for every upload.
+
+    Only one event loop is supported at a time. If the client was opened on
+    a different loop (e.g. a test that runs the app on a fresh loop without
+    shutting the previous one down), it is discarded and a new one opened.
+
+    Returns:
+        The open aioboto3 S3 client
+    """
+    global _async_s3_client, _async_s3_exit_stack, _async_s3_client_lock, _async_s3_loop
+
+    loop = asyncio.get_running_loop()
+    if _async_s3_loop is not loop:
+        # A client bound to another loop cannot be used or closed from here
+        _async_s3_client = None
+        _async_s3_exit_stack = None
+        _async_s3_client_lock = asyncio.Lock()
+        _async_s3_loop = loop
+
+    if _async_s3_client is not None:
+        return _async_s3_client
+
+    async with _async_s3_client_lock:
+        if _async_s3_client is None:
+            s3_client_args = {
+                'aws_access_key_id': settings.AWS_ACCESS_KEY_ID,
+                'aws_secret_access_key': settings.AWS_SECRET_ACCESS_KEY,
+                'region_name': settings.AWS_REGION
+            }
+
+            if settings.AWS_ENDPOINT_URL:
+                s3_client_args['endpoint_url'] = settings.AWS_ENDPOINT_URL
+
+            exit_stack = AsyncExitStack()
+            _async_s3_client = await exit_stack.enter_async_context(
+                aioboto3.Session().client("s3", **s3_client_args))
+            _async_s3_exit_stack = exit_stack
+
+    return _async_s3_client
+
+
+async def close_async_s3_client() -> None:
+    """Close the shared aioboto3 S3 client, if it was opened, and forget its loop."""
+    global _async_s3_client, _async_s3_exit_stack, _async_s3_client_lock, _async_s3_loop
+
+    exit_stack = _async_s3_exit_stack
+    _async_s3_client = None
+    _async_s3_exit_stack = None
+    _async_s3_client_lock = None
+    _async_s3_loop = None
+    if exit_stack is not None:
+        await exit_stack.aclose()
+
+
 async def upload_file_to_s3(
     file: Union[UploadFile, BinaryIO, bytes],
     session_id: int = None,
@@ -133,18 +202,6 @@ async def upload_file_to_s3(
 
         logger.info(f"Uploading file to S3 bucket: {bucket_name}, key: {s3_key}")
 
-        s3_client_args = {
-            'aws_access_key_id': settings.AWS_ACCESS_KEY_ID,
-            'aws_secret_access_key': settings.AWS_SECRET_ACCESS_KEY,
-            'region_name': settings.AWS_REGION
-        }
-
-        if settings.AWS_ENDPOINT_URL:
-            s3_client_args['endpoint_url'] = settings.AWS_ENDPOINT_URL
-
-        # Create aioboto3 session
-        session = aioboto3.Session()
-
         # Ensure file_content is bytes before uploading
         if not isinstance(file_content, bytes):
             logger.warning(f"file_content is not bytes, it's {type(file_content)}. Converting if possible.")
@@ -163,14 +220,14 @@ async def upload_file_to_s3(
             logger.error(f"Failed to convert file_content to bytes, type is {type(file_content)}")
             raise ValueError(f"Cannot upload content of type {type(file_content)} to S3")
 
-        async with session.client("s3", **s3_client_args) as s3_client:
-            logger.info(f"Uploading to S3 with content type: {getattr(file, 'content_type', 'application/octet-stream') if isinstance(file, UploadFile) else 'application/octet-stream'}")
-            await s3_client.put_object(
-                Bucket=bucket_name,
-                Key=s3_key,
-                Body=file_content,
-                ContentType=getattr(file, 'content_type', 'application/octet-stream') if isinstance(file, UploadFile) else 'application/octet-stream'
-            )
+        s3_client = await get_async_s3_client()
+        logger.info(f"Uploading to S3 with content type: {getattr(file, 'content_type', 'application/octet-stream') if isinstance(file, UploadFile) else 'application/octet-stream'}")
+        await s3_client.put_object(
+            Bucket=bucket_name,
+            Key=s3_key,
+            Body=file_content,
+            ContentType=getattr(file, 'content_type', 'application/octet-stream') if isinstance(file, UploadFile) else 'application/octet-stream'
+        )
         logger.info(f"File uploaded to S3 successfully: {s3_key}")
         return s3_key
     except ClientError as e:
@@ -181,6 +238,56 @@ async def upload_file_to_s3(
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred during file upload: {str(e)}")
 
 
+async def upload_fileobj_to_s3(
+    fileobj: BinaryIO,
+    s3_key: str,
+    content_type: str = "application/octet-stream",
+    cache_control: Optional[str] = None
+) -> str:
+    """
+    Stream a file object to S3 without reading it into memory.
+
+    boto3 reads the object in chunks and switches to a multipart upload for
+    large files, so memory use does not grow with the file size.
+
+    Args:
+        fileobj: Readable binary file object, positioned at the start
+        s3_key: The key (path) to store the file under
+        content_type: MIME type stored with the object
+        cache_control: Optional Cache-Control header stored with the object
+
+    Returns:
+        String containing the S3 key
+    """
+    try:
+        s3_client = get_s3_client()
+        bucket_name = settings.AWS_S3_BUCKET_NAME
+
+        logger.info(f"Streaming file to S3 bucket: {bucket_name}, key: {s3_key}")
+
+        extra_args = {"ContentType": content_type}
+        if cache_control:
+            extra_args["CacheControl"] = cache_control
+
+        # Use thread pool to avoid blocking
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(
+            None,
+            lambda: s3_client.upload_fileobj(
+                fileobj,
+                bucket_name,
+                s3_key,
+                ExtraArgs=extra_args
+            )
+        )
+
+        logger.info(f"File uploaded to S3 successfully: {s3_key}")
+        return s3_key
+    except (ClientError, S3UploadFailedError) as e:
+        logger.error(f"S3 error during streamed upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"S3 upload failed: {str(e)}")
+
+
 async def get_file_from_s3(s3_key: str) -> bytes:
     """
     Retrieve a file from S3 storage.
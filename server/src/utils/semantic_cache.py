@@ -0,0 +1,179 @@
+"""
+Semantic Cache Utilities
+
+This module provides an in-process semantic cache that reuses LLM answers
+for near-duplicate questions asked against the same content.
+"""
+
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+
+from core.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def content_fingerprint(content: Union[str, bytes]) -> str:
+    """
+    Compute a stable fingerprint for a piece of content.
+
+    Args:
+        content: The text or raw bytes to fingerprint
+
+    Returns:
+        str: Hex SHA-256 digest of the content
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question before embedding it.
+
+    Lowercases the text and collapses whitespace so trivially different
+    phrasings map to the same embedding input.
+
+    Args:
+        question: The raw question text
+
+    Returns:
+        str: The normalized question
+    """
+    return " ".join(question.lower().split())
+
+
+@lru_cache(maxsize=1)
+def get_openai_embeddings() -> OpenAIEmbeddings:
+    """
+    Get the OpenAI embeddings client shared by every cache and index.
+
+    Created on first use and reused afterwards, so its HTTP connection pool
+    is shared instead of set up again for each cache or indexed document.
+
+    Returns:
+        OpenAIEmbeddings: The shared embeddings client
+    """
+    return OpenAIEmbeddings(
+        api_key=settings.OPENAI_API_KEY,
+        model="text-embedding-3-small"
+    )
+
+
+def _default_embedder() -> Callable[[str], List[float]]:
+    """Get the OpenAI embedding function used when none is supplied."""
+    return get_openai_embeddings().embed_query
+
+
+class SemanticAnswerCache:
+    """
+    Cache of LLM answers looked up by question embedding similarity.
+
+    Entries are bucketed by content fingerprint, so an answer is only reused
+    for the exact same context. Within a bucket, the cached question with the
+    highest cosine similarity is returned if it meets the threshold.
+
+    The cache is thread-safe so it can be used from worker threads.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        max_entries: int = 10000,
+        embedder: Optional[Callable[[str], List[float]]] = None
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a cache hit
+            max_entries: Maximum number of cached answers across all buckets
+            embedder: Optional function mapping text to an embedding vector
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._embedder = embedder
+        self._lock = threading.Lock()
+        # content hash -> (embedding matrix, cached values)
+        self._buckets: Dict[str, Tuple[np.ndarray, List[Any]]] = {}
+        self._size = 0
+
+    def embed(self, question: str) -> np.ndarray:
+        """
+        Embed a question as a unit-length vector.
+
+        Args:
+            question: The question text
+
+        Returns:
+            np.ndarray: The normalized embedding
+        """
+        if self._embedder is None:
+            self._embedder = _default_embedder()
+        vector = np.asarray(self._embedder(normalize_question(question)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: np.ndarray, content_hash: str) -> Optional[Any]:
+        """
+        Find a cached value for a question embedding.
+
+        Args:
+            embedding: Normalized question embedding from embed()
+            content_hash: Fingerprint of the content the question is about
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        with self._lock:
+            bucket = self._buckets.get(content_hash)
+            if bucket is None:
+                return None
+            matrix, values = bucket
+            similarities = matrix @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                return values[best]
+            return None
+
+    def store(self, embedding: np.ndarray, content_hash: str, value: Any) -> None:
+        """
+        Add a value to the cache.
+
+        Args:
+            embedding: Normalized question embedding from embed()
+            content_hash: Fingerprint of the content the question is about
+            value: The value to cache
+        """
+        with self._lock:
+            if self._size >= self.max_entries:
+                self._evict_oldest()
+
+            bucket = self._buckets.get(content_hash)
+            if bucket is None:
+                self._buckets[content_hash] = (embedding[np.newaxis, :], [value])
+            else:
+                matrix, values = bucket
+                values.append(value)
+                self._buckets[content_hash] = (np.vstack([matrix, embedding]), values)
+            self._size += 1
+
+    def _evict_oldest(self) -> None:
+        """Drop the oldest entry of the least recently created bucket to make room."""
+        oldest = next(iter(self._buckets), None)
+        if oldest is None:
+            return
+        matrix, values = self._buckets[oldest]
+        if len(values) > 1:
+            self._buckets[oldest] = (matrix[1:], values[1:])
+        else:
+            del self._buckets[oldest]
+        self._size -= 1
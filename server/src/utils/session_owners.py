@@ -0,0 +1,72 @@
+"""
+Session Ownership Utilities
+
+This module caches which user owns each session, so the ownership check
+done by most endpoints skips the database for recently used sessions.
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.models import Session as SessionModel
+
+# Ownership never changes, so entries only need to expire to bound how long
+# a session deleted by another worker process is still treated as existing
+SESSION_OWNER_CACHE_TTL_SECONDS = 60
+SESSION_OWNER_CACHE_MAX_SIZE = 4096
+_session_owner_cache: Dict[int, Tuple[float, int]] = {}
+
+
+def get_session_owner(db: Session, session_id: int) -> Optional[int]:
+    """
+    Get the ID of the user who owns a session.
+
+    Args:
+        db: Database session
+        session_id: ID of the session
+
+    Returns:
+        The owner's user ID, or None if the session does not exist
+    """
+    entry = _session_owner_cache.get(session_id)
+    if entry is not None and entry[0] >= time.monotonic():
+        return entry[1]
+
+    user_id = db.query(SessionModel.user_id).filter(
+        SessionModel.id == session_id).scalar()
+    if user_id is None:
+        _session_owner_cache.pop(session_id, None)
+        return None
+
+    if len(_session_owner_cache) >= SESSION_OWNER_CACHE_MAX_SIZE:
+        _session_owner_cache.pop(next(iter(_session_owner_cache)), None)
+    _session_owner_cache[session_id] = (
+        time.monotonic() + SESSION_OWNER_CACHE_TTL_SECONDS, user_id)
+    return user_id
+
+
+def user_owns_session(db: Session, session_id: int, user_id: int) -> bool:
+    """
+    Check that a session exists and belongs to a user.
+
+    Args:
+        db: Database session
+        session_id: ID of the session to check
+        user_id: ID of the user who must own the session
+
+    Returns:
+        bool: True if the session exists and is owned by the user
+    """
+    return get_session_owner(db, session_id) == user_id
+
+
+def forget_session_owner(session_id: int) -> None:
+    """
+    Drop a session from the cache, e.g. after it has been deleted.
+
+    Args:
+        session_id: ID of the session
+    """
+    _session_owner_cache.pop(session_id, None)
@@ -1,12 +1,16 @@
 import os
-from typing import Dict, List, Any, Tuple, AsyncGenerator
+from typing import Dict, List, Any, Sequence, Tuple, AsyncGenerator
 import json
 import logging
-import traceback
 import asyncio
+from functools import lru_cache
+import httpx
+import tiktoken
 from langchain_openai import ChatOpenAI
+from openai import RateLimitError
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
-from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, MessagesPlaceholder, SystemMessagePromptTemplate
 
 from core.config import settings
 
@@ -14,45 +18,54 @@ from core.config import settings
 logger = logging.getLogger(__name__)
 
 
-def get_openai_llm(temperature: float = 0.0, streaming: bool = False):
-    """
-    Create an OpenAI LLM with the specified temperature.
+# Connection pool shared by every synchronous OpenAI call, so TLS
+# connections are reused across requests instead of set up per call
+_http_client = httpx.Client(
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+)
 
-    Args:
-        temperature: The temperature parameter for the LLM
-        streaming: Whether to enable streaming
 
-    Returns:
-        An OpenAI LLM instance
-    """
+def _create_openai_llm(temperature: float, streaming: bool) -> ChatOpenAI:
+    """Create a ChatOpenAI instance that uses the shared connection pool."""
     return ChatOpenAI(
         api_key=settings.OPENAI_API_KEY,
         temperature=temperature,
         model="gpt-4o",
-        streaming=streaming
+        streaming=streaming,
+        http_client=_http_client
     )
 
 
-def analyze_text(text: str) -> Dict[str, Any]:
+@lru_cache(maxsize=None)
+def _get_shared_openai_llm(temperature: float) -> ChatOpenAI:
+    """Return the process-wide non-streaming LLM for a temperature."""
+    return _create_openai_llm(temperature, streaming=False)
+
+
+def get_openai_llm(temperature: float = 0.0, streaming: bool = False):
     """
-    Perform comprehensive analysis on text, extracting sentiment, emotions, topics, and a summary.
+    Get an OpenAI LLM with the specified temperature.
+
+    Non-streaming LLMs are created once per temperature and reused. Streaming
+    LLMs are created per call, since their async client is bound to the event
+    loop it was first used on.
 
     Args:
-        text: The text content to analyze
+        temperature: The temperature parameter for the LLM
+        streaming: Whether to enable streaming
 
     Returns:
-        Dict with analysis results containing sentiment, emotions, topics, and summary
+        An OpenAI LLM instance
     """
-    try:
-        logger.info("Starting text analysis with OpenAI")
+    if streaming:
+        return _create_openai_llm(temperature, streaming=True)
+    return _get_shared_openai_llm(temperature)
 
-        # Create the LLM
-        llm = get_openai_llm(temperature=0.2)
 
-        # Improved system prompt for analysis
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessagePromptTemplate.from_template(
-                """
+# System prompt for analysis, built once at import and shared by every call
+_ANALYSIS_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        """
 You are DeepPurple, an expert AI system specialising in nuanced text analysis, including sentiment analysis, emotion detection, topic modelling, syntax analysis, and text summarisation.
 
 Your task is to analyse any provided text in a comprehensive, insightful, and human-readable manner. Structure your analysis into clearly labelled sections using paragraphs and full sentences—not bullet points or JSON. For each section, write in a professional, objective, and forward-thinking tone. Your analysis must cover:
@@ -72,20 +85,55 @@ Your output must be detailed, well-structured, and accessible to professionals a
 
 Be accurate, comprehensive, and never evasive. If a category is not relevant, briefly state why.
 """
-            ),
-            HumanMessagePromptTemplate.from_template(
-                """Please analyse the following text as described:
+    ),
+    HumanMessagePromptTemplate.from_template(
+        """Please analyse the following text as described:
 
 ```
 {text}
 ```
 """
-            )
-        ])
+    )
+])
+
+
+# Maximum number of characters of a text sent for analysis
+ANALYSIS_MAX_CHARS = 10000
+
+# Analysis text returned in place of a result when the OpenAI call fails
+ANALYSIS_ERROR_MESSAGE = "Unable to analyse the provided text due to an internal error."
+
+
+def _build_analysis_chain():
+    """
+    Build the LangChain pipeline used for text analysis.
+
+    Returns:
+        A runnable chain mapping {"text": ...} inputs to the analysis string
+    """
+    llm = get_openai_llm(temperature=0.2)
+    return _ANALYSIS_PROMPT | llm | StrOutputParser()
+
+
+def analyze_text(text: str) -> Dict[str, Any]:
+    """
+    Perform comprehensive analysis on text, extracting sentiment, emotions, topics, and a summary.
+
+    This call blocks on the OpenAI request, so async endpoints should run it
+    via asyncio.to_thread to keep the event loop free.
+
+    Args:
+        text: The text content to analyze
+
+    Returns:
+        Dict with analysis results containing sentiment, emotions, topics, and summary
+    """
+    try:
+        logger.info("Starting text analysis with OpenAI")
 
         # Create chain and execute
-        chain = prompt | llm | StrOutputParser()
-        response = chain.invoke({"text": text[:10000]})  # Limit text length
+        chain = _build_analysis_chain()
+        response = chain.invoke({"text": text[:ANALYSIS_MAX_CHARS]})  # Limit text length
 
         logger.debug(f"Raw response from OpenAI: {response[:500]}...")
 
@@ -94,34 +142,56 @@ Be accurate, comprehensive, and never evasive. If a category is not relevant, br
 
     except Exception as e:
         logger.error(f"Error during text analysis: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.debug("Traceback follows", exc_info=True)
         return {
-            "analysis": "Unable to analyse the provided text due to an internal error."
+            "analysis": ANALYSIS_ERROR_MESSAGE
         }
 
 
-def answer_question(question: str, context: str, conversation_history: List[Dict[str, str]] = None) -> Tuple[str, List[str]]:
+def overall_sentiment(sentiment_scores: Dict[str, float]) -> str:
     """
-    Answer a question based on the provided context and previous conversation history.
+    Pick the overall sentiment label from positive/negative/neutral scores.
 
     Args:
-        question: The user's question
-        context: The text content to use as reference
-        conversation_history: Optional list of previous Q&A pairs
+        sentiment_scores: Mapping of sentiment label to score
 
     Returns:
-        Tuple containing the answer and sources
+        str: "positive" or "negative" if that score is strictly the highest,
+        otherwise "neutral" (including when positive and negative tie)
     """
-    try:
-        logger.debug(f"Starting to answer question: '{question[:50]}...'")
-        conversation_messages = []
-        if conversation_history and len(conversation_history) > 0:
-            for i, qa_pair in enumerate(conversation_history):
-                conversation_messages.append(f"User: {qa_pair['question']}")
-                conversation_messages.append(f"Assistant: {qa_pair['answer']}")
-
-        system_message = SystemMessagePromptTemplate.from_template(
-            """
+    pos = sentiment_scores.get("positive", 0)
+    neg = sentiment_scores.get("negative", 0)
+    neu = sentiment_scores.get("neutral", 0)
+
+    if pos > neg and pos > neu:
+        return "positive"
+    if neg > pos and neg > neu:
+        return "negative"
+    return "neutral"
+
+
+def dominant_emotion(emotion_scores: Dict[str, float]) -> str:
+    """
+    Pick the highest scoring emotion.
+
+    Args:
+        emotion_scores: Mapping of emotion name to score
+
+    Returns:
+        str: The highest scoring emotion, or "neutral" if no emotion scores above 0
+    """
+    dominant = max(
+        (emotion for emotion in emotion_scores if emotion != "dominant_emotion"),
+        key=emotion_scores.get,
+        default=None
+    )
+    if dominant is None or emotion_scores[dominant] <= 0:
+        return "neutral"
+    return dominant
+
+
+# System prompt shared by the question-answering paths
+_QA_SYSTEM_PROMPT = """
 You are DeepPurple, an expert AI system specialising in nuanced text analysis, including sentiment analysis, emotion detection, topic modelling, syntax analysis, and text summarisation.
 
 Your task is to answer user questions by providing clear, structured, and in-depth analysis of any provided text. If a user provides text for analysis, apply your analytical skills as described below and base your answer strictly on the content. If the user simply asks a general question, answer naturally, drawing from your expertise, but do not mention missing context.
@@ -136,36 +206,207 @@ Your analysis or answers should cover, as appropriate:
 Present your response in labelled sections, using full sentences and paragraphs. Write in a professional, objective, and forward-thinking tone suitable for researchers and analysts.
 
 Be comprehensive, accurate, and never evasive. Do not use lists, bullet points, or JSON.
+"""
 
+# Only the non-streaming path parses sources out of the response
+_QA_SOURCES_INSTRUCTION = """
 If you reference the context, specify the sections you relied on at the end under "Sources:"; otherwise, state "General knowledge".
 """
-        )
 
-        human_message = HumanMessagePromptTemplate.from_template(
-            """Previous conversation:
-{conversation_history}
 
-Context:
+def _build_qa_prompt(system_prompt: str) -> ChatPromptTemplate:
+    """
+    Build a question-answering prompt with a cache-friendly message layout.
+
+    The system prompt and the document context come first, followed by the
+    previous turns as separate messages and finally the new question. Each
+    turn in a session therefore only appends to a byte-identical prefix,
+    which lets the provider's prompt cache reuse the shared part.
+
+    Args:
+        system_prompt: The system instructions for the model
+
+    Returns:
+        ChatPromptTemplate: The assembled prompt template
+    """
+    return ChatPromptTemplate.from_messages([
+        SystemMessagePromptTemplate.from_template(system_prompt),
+        HumanMessagePromptTemplate.from_template(
+            """Context:
 ```
 {context}
 ```
-
-Question: {question}
+"""
+        ),
+        MessagesPlaceholder(variable_name="conversation_history"),
+        HumanMessagePromptTemplate.from_template(
+            """Question: {question}
 
 Provide a detailed, insightful answer or analysis as described above. If I've provided text to analyse, ground your answer in that text.
 """
         )
+    ])
 
-        chat_prompt = ChatPromptTemplate.from_messages([system_message, human_message])
 
-        inputs = {
-            "question": question,
-            "context": context[:10000],
-            "conversation_history": "\n".join(conversation_messages)
-        }
+_QA_PROMPT = _build_qa_prompt(_QA_SYSTEM_PROMPT + _QA_SOURCES_INSTRUCTION)
+_QA_STREAM_PROMPT = _build_qa_prompt(_QA_SYSTEM_PROMPT)
+
+
+# Maximum number of context characters sent with each question
+QA_CONTEXT_MAX_CHARS = 10000
+
+# Message streamed in place of the rest of an answer when the OpenAI call fails
+QA_STREAM_ERROR_MESSAGE = "I couldn't process your question due to a technical error. Please try again later."
+
+# Questions longer than this are treated as containing pasted text when the
+# session has no files
+PASTED_TEXT_MIN_CHARS = 100
+
+# Question used when pasted text has no question of its own
+PASTED_TEXT_DEFAULT_QUESTION = "Can you analyze this text for me?"
+
+
+def extract_question_and_context(question: str) -> Tuple[str, str]:
+    """
+    Split a question containing pasted text into the question and the text.
+
+    Text after the first question mark is used as context when there is
+    enough of it; otherwise the whole input is context for a generic
+    analysis question. Uses find() and slicing so the input is scanned once
+    and not split into a list.
+
+    Args:
+        question: The raw question, possibly containing pasted text
+
+    Returns:
+        Tuple of (question to ask, context text)
+    """
+    index = question.find("?")
+    # If there's substantial text after the question mark
+    if index != -1 and len(question) - index - 1 > 50:
+        return question[:index + 1], question[index + 1:].strip()
+    # No clear separation, treat the whole thing as context
+    return PASTED_TEXT_DEFAULT_QUESTION, question
+
+
+# Token limits for conversation history sent with each question. The most
+# recent turn is always kept verbatim; older answers are truncated and the
+# oldest turns dropped once the budget is spent.
+HISTORY_TOKEN_BUDGET = 2000
+HISTORY_ANSWER_TOKEN_LIMIT = 400
+
+_encoding = None
+
+
+def _get_encoding():
+    """Return the tokenizer for the QA model, loading it on first use."""
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.encoding_for_model("gpt-4o")
+    return _encoding
+
+
+def _trim_conversation_history(conversation_history: Sequence[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    Trim conversation history to fit the history token budget.
+
+    Args:
+        conversation_history: List of previous (question, answer) tuples, oldest first
+
+    Returns:
+        The trimmed history, oldest first
+    """
+    encoding = _get_encoding()
+    trimmed = []
+    used_tokens = 0
+
+    for index, (previous_question, previous_answer) in enumerate(reversed(conversation_history)):
+        # encode_ordinary treats text such as "<|endoftext|>" as plain text
+        # instead of raising, so pasted special tokens cannot break trimming
+        answer_tokens = encoding.encode_ordinary(previous_answer)
+        if index > 0 and len(answer_tokens) > HISTORY_ANSWER_TOKEN_LIMIT:
+            answer_tokens = answer_tokens[:HISTORY_ANSWER_TOKEN_LIMIT]
+            previous_answer = encoding.decode(answer_tokens)
+
+        turn_tokens = len(encoding.encode_ordinary(previous_question)) + len(answer_tokens)
+        if index > 0 and used_tokens + turn_tokens > HISTORY_TOKEN_BUDGET:
+            break
+
+        trimmed.append((previous_question, previous_answer))
+        used_tokens += turn_tokens
+
+    if len(trimmed) < len(conversation_history):
+        logger.debug(
+            f"Dropped {len(conversation_history) - len(trimmed)} old Q&A pairs to fit the history budget")
+
+    trimmed.reverse()
+    return trimmed
+
+
+def _build_qa_inputs(question: str, context: str, conversation_history: List[Tuple[str, str]] = None) -> Dict[str, Any]:
+    """
+    Build the prompt inputs for a question-answering call.
+
+    Args:
+        question: The user's question
+        context: The text content to use as reference
+        conversation_history: Optional list of previous (question, answer) tuples
+
+    Returns:
+        Dict of template variables for the QA prompt
+    """
+    history_messages = []
+    if conversation_history:
+        history_messages = list(_history_messages(tuple(conversation_history)))
+
+    return {
+        "question": question,
+        "context": context[:QA_CONTEXT_MAX_CHARS],
+        "conversation_history": history_messages
+    }
+
+
+@lru_cache(maxsize=256)
+def _history_messages(conversation_history: Tuple[Tuple[str, str], ...]) -> Tuple[BaseMessage, ...]:
+    """
+    Trim conversation history and convert it into chat messages.
+
+    Memoized because consecutive questions in a session, retries and the
+    streaming and non-streaming paths send the same history, and trimming
+    tokenizes every answer.
+
+    Args:
+        conversation_history: Previous (question, answer) tuples, oldest first
+
+    Returns:
+        Alternating human and AI messages, oldest first
+    """
+    history_messages = []
+    for previous_question, previous_answer in _trim_conversation_history(conversation_history):
+        history_messages.append(HumanMessage(content=previous_question))
+        history_messages.append(AIMessage(content=previous_answer))
+    return tuple(history_messages)
+
+
+def answer_question(question: str, context: str, conversation_history: List[Tuple[str, str]] = None) -> Tuple[str, List[str]]:
+    """
+    Answer a question based on the provided context and previous conversation history.
+
+    Args:
+        question: The user's question
+        context: The text content to use as reference
+        conversation_history: Optional list of previous (question, answer) tuples
+
+    Returns:
+        Tuple containing the answer and sources
+    """
+    try:
+        logger.debug(f"Starting to answer question: '{question[:50]}...'")
+
+        inputs = _build_qa_inputs(question, context, conversation_history)
 
         llm = get_openai_llm(temperature=0.2)
-        chain = chat_prompt | llm | StrOutputParser()
+        chain = _QA_PROMPT | llm | StrOutputParser()
         response = chain.invoke(inputs)
 
         # Split out Sources section if present
@@ -185,20 +426,23 @@ Provide a detailed, insightful answer or analysis as described above. If I've pr
 
         return answer, sources
 
+    except RateLimitError:
+        # Surfaced to the client as a 429; not worth a traceback
+        raise
     except Exception as e:
         logger.error(f"Error answering question: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.debug("Traceback follows", exc_info=True)
         raise
 
 
-async def answer_question_stream(question: str, context: str, conversation_history: List[Dict[str, str]] = None) -> AsyncGenerator[str, None]:
+async def answer_question_stream(question: str, context: str, conversation_history: List[Tuple[str, str]] = None) -> AsyncGenerator[str, None]:
     """
     Stream answer to a question based on provided context and conversation history.
 
     Args:
         question: The user's question
         context: The text content to use as reference
-        conversation_history: Optional list of previous Q&A pairs
+        conversation_history: Optional list of previous (question, answer) tuples
 
     Yields:
         Token by token response
@@ -206,56 +450,10 @@ async def answer_question_stream(question: str, context: str, conversation_histo
     try:
         logger.debug(f"Starting to stream answer for: '{question[:50]}...'")
 
-        conversation_messages = []
-        if conversation_history and len(conversation_history) > 0:
-            for i, qa_pair in enumerate(conversation_history):
-                conversation_messages.append(f"User: {qa_pair['question']}")
-                conversation_messages.append(f"Assistant: {qa_pair['answer']}")
-
-        system_message = SystemMessagePromptTemplate.from_template(
-            """
-You are DeepPurple, an expert AI system specialising in nuanced text analysis, including sentiment analysis, emotion detection, topic modelling, syntax analysis, and text summarisation.
-
-Your task is to answer user questions by providing clear, structured, and in-depth analysis of any provided text. If a user provides text for analysis, apply your analytical skills as described below and base your answer strictly on the content. If the user simply asks a general question, answer naturally, drawing from your expertise, but do not mention missing context.
-
-Your analysis or answers should cover, as appropriate:
-- Sentiment analysis: clear, evidence-based assessment.
-- Emotion detection: main emotions and their triggers.
-- Topic modelling: key themes and supporting details.
-- Syntax analysis: any notable linguistic or grammatical features.
-- Text summarisation: concise, stand-alone summary.
-
-Present your response in labelled sections, using full sentences and paragraphs. Write in a professional, objective, and forward-thinking tone suitable for researchers and analysts.
-
-Be comprehensive, accurate, and never evasive. Do not use lists, bullet points, or JSON.
-"""
-        )
-
-        human_message = HumanMessagePromptTemplate.from_template(
-            """Previous conversation:
-{conversation_history}
-
-Context:
-```
-{context}
-```
-
-Question: {question}
-
-Provide a detailed, insightful answer or analysis as described above. If I've provided text to analyse, ground your answer in that text.
-"""
-        )
-
-        chat_prompt = ChatPromptTemplate.from_messages([system_message, human_message])
-
-        inputs = {
-            "question": question,
-            "context": context[:10000],
-            "conversation_history": "\n".join(conversation_messages)
-        }
+        inputs = _build_qa_inputs(question, context, conversation_history)
 
         llm = get_openai_llm(temperature=0.2, streaming=True)
-        chain = chat_prompt | llm
+        chain = _QA_STREAM_PROMPT | llm
 
         async for chunk in chain.astream(inputs):
             if hasattr(chunk, 'content'):
@@ -272,27 +470,14 @@ Provide a detailed, insightful answer or analysis as described above. If I've pr
 
     except Exception as e:
         logger.error(f"Error streaming answer: {str(e)}")
-        logger.debug(traceback.format_exc())
-        yield "I couldn't process your question due to a technical error. Please try again later."
-
+        logger.debug("Traceback follows", exc_info=True)
+        yield QA_STREAM_ERROR_MESSAGE
 
-async def visualize_text(text: str) -> Dict[str, Any]:
-    """
-    Generate a visual representation of the text content.
 
-    Args:
-        text: The text content to visualize
-
-    Returns:
-        Dict with visualization data
-    """
-    try:
-        logger.info("Starting text visualization")
-
-        llm = get_openai_llm(temperature=0.2)
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessagePromptTemplate.from_template(
-                """
+# Prompt for visualization, built once at import and shared by every call
+_VISUALIZE_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        """
 You are DeepPurple, an expert AI system specialising in nuanced text analysis, including sentiment analysis, emotion detection, topic modelling, syntax analysis, and text summarisation.
 
 Your task is to analyze the provided text and extract the following key metrics for visualization:
@@ -401,7 +586,7 @@ If the text is irrelevant to your described function as deep purple or does not
     "actors": []
 }}
 """),
-            HumanMessagePromptTemplate.from_template(
+    HumanMessagePromptTemplate.from_template(
 """Input Text:
 ```
 {text}
@@ -409,11 +594,29 @@ If the text is irrelevant to your described function as deep purple or does not
 """)
 ])
 
-        chain = prompt | llm | JsonOutputParser()
-        response = chain.invoke({"text": text[:10000]})  # Limit text length   
+
+async def visualize_text(text: str) -> Dict[str, Any]:
+    """
+    Generate a visual representation of the text content.
+
+    Args:
+        text: The text content to visualize
+
+    Returns:
+        Dict with visualization data
+    """
+    try:
+        logger.info("Starting text visualization")
+
+        llm = get_openai_llm(temperature=0.2)
+        chain = _VISUALIZE_PROMPT | llm | JsonOutputParser()
+        # Run the blocking OpenAI call in a worker thread so the event loop
+        # keeps serving other requests
+        response = await asyncio.to_thread(
+            chain.invoke, {"text": text[:ANALYSIS_MAX_CHARS]})  # Limit text length
         return response
 
     except Exception as e:
         logger.error(f"Error during text visualization: {str(e)}")
-        logger.debug(traceback.format_exc())
+        logger.debug("Traceback follows", exc_info=True)
         return {"visualization": "Unable to visualize the provided text due to an internal error."} 
\ No newline at end of file
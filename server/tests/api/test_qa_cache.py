@@ -0,0 +1,58 @@
+import pytest
+
+from api import text_analysis_api
+
+
+async def _collect(tokens):
+    return "".join([token async for token in tokens])
+
+
+@pytest.mark.asyncio
+async def test_streamed_answer_is_reused_by_plain_question(monkeypatch):
+    """
+    -- Test that an answer cached by the streaming path is served to the plain path --
+    """
+    async def fake_stream(question, context, conversation_history):
+        yield "Streamed "
+        yield "answer"
+
+    async def fail_answer(*args):
+        raise AssertionError("the cached answer should have been used")
+
+    monkeypatch.setattr(text_analysis_api, "_qa_cache", {})
+    monkeypatch.setattr(text_analysis_api, "answer_question_stream", fake_stream)
+    monkeypatch.setattr(text_analysis_api, "_run_answer_question", fail_answer)
+
+    history = [("Earlier question", "Earlier answer")]
+    streamed = await _collect(text_analysis_api._answer_question_stream_limited(
+        1, "What is it about?", "Some context", history))
+    answer_text, sources = await text_analysis_api._answer_question_limited(
+        1, "What is it about?", "Some context", history)
+
+    assert streamed == "Streamed answer"
+    assert answer_text == "Streamed answer"
+    assert sources == []
+
+
+@pytest.mark.asyncio
+async def test_plain_answer_is_replayed_by_streaming_question(monkeypatch):
+    """
+    -- Test that an answer cached by the plain path is replayed as text when streaming --
+    """
+    async def fake_answer(question, context, conversation_history):
+        return "Plain answer", ["source.txt"]
+
+    def fail_stream(*args):
+        raise AssertionError("the cached answer should have been used")
+
+    monkeypatch.setattr(text_analysis_api, "_qa_cache", {})
+    monkeypatch.setattr(text_analysis_api, "_run_answer_question", fake_answer)
+    monkeypatch.setattr(text_analysis_api, "answer_question_stream", fail_stream)
+
+    answer = await text_analysis_api._answer_question_limited(
+        2, "Summarize it", "Some context", [])
+    streamed = await _collect(text_analysis_api._answer_question_stream_limited(
+        2, "Summarize it", "Some context", []))
+
+    assert answer == ("Plain answer", ["source.txt"])
+    assert streamed == "Plain answer"
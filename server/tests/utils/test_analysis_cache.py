@@ -0,0 +1,61 @@
+from utils.analysis_cache import AnalysisCache
+
+# Deterministic embeddings so the cache can be tested without calling OpenAI
+FAKE_EMBEDDINGS = {
+    "i loved this product.": [1.0, 0.0],
+    "i loved this product!": [0.99, 0.1],
+    "the delivery was late.": [0.0, 1.0],
+}
+
+
+def fake_embedder(text):
+    return FAKE_EMBEDDINGS[text]
+
+
+def test_analysis_cache_exact_hit_skips_embedding():
+    """
+    -- Test that resubmitting the same text is served without embedding it --
+    """
+    calls = []
+
+    def counting_embedder(text):
+        calls.append(text)
+        return fake_embedder(text)
+
+    cache = AnalysisCache(threshold=0.92, embedder=counting_embedder)
+    cache.set("I loved this product.", {"analysis": "Positive"})
+    calls.clear()
+
+    result, embedding = cache.get("  I loved   this product.  ")
+
+    assert result == {"analysis": "Positive"}
+    assert embedding is None
+    assert calls == []
+
+
+def test_analysis_cache_semantic_hit_and_miss():
+    """
+    -- Test that near-identical texts hit the cache and unrelated texts miss --
+    """
+    cache = AnalysisCache(threshold=0.92, embedder=fake_embedder)
+    cache.set("I loved this product.", {"analysis": "Positive"})
+
+    result, _ = cache.get("I loved this product!")
+    assert result == {"analysis": "Positive"}
+
+    result, embedding = cache.get("The delivery was late.")
+    assert result is None
+    assert embedding is not None
+
+
+def test_analysis_cache_returns_copies():
+    """
+    -- Test that callers mutating a cached result do not change the cache --
+    """
+    cache = AnalysisCache(threshold=0.92, embedder=fake_embedder)
+    cache.set("I loved this product.", {"analysis": "Positive"})
+
+    result, _ = cache.get("I loved this product.")
+    result["analysis"] = "Changed"
+
+    assert cache.get("I loved this product.")[0] == {"analysis": "Positive"}
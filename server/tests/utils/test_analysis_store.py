@@ -0,0 +1,48 @@
+import sqlite3
+
+import pytest
+
+from utils.analysis_store import AnalysisStore
+
+
+def test_analysis_store_round_trip_survives_reopen(tmp_path):
+    """
+    -- Test that stored analyses are returned again after reopening the store --
+    """
+    path = str(tmp_path / "analysis_cache.db")
+    store = AnalysisStore(path)
+
+    assert store.get("1:abc") is None
+    store.set("1:abc", {"analysis": "Positive"})
+    store.set("1:abc", {"analysis": "Negative"})
+
+    reopened = AnalysisStore(path)
+    assert reopened.get("1:abc") == {"analysis": "Negative"}
+    assert reopened.get("2:abc") is None
+
+
+def test_analysis_store_keeps_only_the_newest_entries(tmp_path):
+    """
+    -- Test that the oldest analyses are deleted once the store is full --
+    """
+    store = AnalysisStore(str(tmp_path / "analysis_cache.db"), max_entries=2)
+    store._connection().execute(
+        "INSERT INTO analyze_cache (key, result, created_at) VALUES (?, ?, ?)",
+        ("old", b'{"analysis": "Old"}', 0))
+
+    store.set("1:abc", {"analysis": "Positive"})
+    store.set("2:abc", {"analysis": "Negative"})
+
+    assert store.get("old") is None
+    assert store.get("1:abc") == {"analysis": "Positive"}
+    assert store.get("2:abc") == {"analysis": "Negative"}
+
+
+def test_analysis_store_opens_lazily(tmp_path):
+    """
+    -- Test that an unusable path only fails when the store is used --
+    """
+    store = AnalysisStore(str(tmp_path / "missing" / "analysis_cache.db"))
+
+    with pytest.raises(sqlite3.OperationalError):
+        store.get("1:abc")
@@ -0,0 +1,31 @@
+import numpy as np
+
+from utils.chunk_index import build_chunk_index, chunk_text
+
+
+def fake_embed_documents(texts):
+    # Embed each chunk by the letter it is made of, so searches are predictable
+    return [[1.0 if text.startswith(letter) else 0.0 for letter in "abc"] for text in texts]
+
+
+def test_chunk_text_covers_whole_text_with_overlap():
+    """
+    -- Test that chunks overlap and together cover the whole text --
+    """
+    text = "x" * 3000
+    chunks = chunk_text(text, chunk_size=1500, overlap=200)
+
+    assert [len(chunk) for chunk in chunks] == [1500, 1500, 400]
+    assert chunk_text("short", chunk_size=1500, overlap=200) == ["short"]
+    assert chunk_text("", chunk_size=1500, overlap=200) == []
+
+
+def test_chunk_index_returns_most_similar_chunks_in_document_order():
+    """
+    -- Test that search returns the best matching chunks in document order --
+    """
+    text = "a" * 10 + "b" * 10 + "c" * 10
+    index = build_chunk_index(text, chunk_size=10, overlap=0, embed_documents=fake_embed_documents)
+
+    assert index.search(np.array([0.0, 0.0, 1.0], dtype=np.float32), k=1) == ["c" * 10]
+    assert index.search(np.array([0.6, 0.0, 0.8], dtype=np.float32), k=2) == ["a" * 10, "c" * 10]
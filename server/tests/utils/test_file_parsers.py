@@ -0,0 +1,40 @@
+from utils.file_parsers import detect_image_mime_type, detect_mime_type
+
+
+def test_detect_mime_type_recognises_signatures():
+    """
+    -- Test that PDFs and images are recognised from their leading bytes --
+    """
+    assert detect_mime_type(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3") == "application/pdf"
+    assert detect_mime_type(b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR") == "image/png"
+    assert detect_mime_type(b"\xff\xd8\xff\xe0\x00\x10JFIF") == "image/jpeg"
+    assert detect_mime_type(b"GIF89a\x01\x00\x01\x00") == "image/gif"
+    assert detect_mime_type(b"RIFF\x24\x00\x00\x00WEBPVP8 ") == "image/webp"
+
+
+def test_detect_mime_type_falls_back_to_libmagic_for_text():
+    """
+    -- Test that plain text without a known signature is still detected --
+    """
+    assert detect_mime_type(b"Hello, this is a plain text file.\n") == "text/plain"
+
+
+def test_detect_mime_type_trusts_text_extensions_for_text():
+    """
+    -- Test that .csv/.txt names decide the type only when the header is text --
+    """
+    assert detect_mime_type(b"name,score\nalice,3\n", "scores.CSV") == "text/csv"
+    assert detect_mime_type(b"Meeting notes\n", "notes.txt") == "text/plain"
+    assert detect_mime_type(b"%PDF-1.7\n", "renamed.txt") == "application/pdf"
+    assert detect_mime_type(b"\x00\x01\x02\x03binary", "data.csv") != "text/csv"
+
+
+def test_detect_image_mime_type_accepts_only_image_signatures():
+    """
+    -- Test that only JPEG, PNG, GIF and WebP headers are accepted as images --
+    """
+    assert detect_image_mime_type(b"\x89PNG\r\n\x1a\n\x00\x00\x00\r") == "image/png"
+    assert detect_image_mime_type(b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01") == "image/jpeg"
+    assert detect_image_mime_type(b"RIFF\x24\x00\x00\x00WEBP") == "image/webp"
+    assert detect_image_mime_type(b"%PDF-1.7\n%\xe2\xe3") is None
+    assert detect_image_mime_type(b"<svg xmlns=") is None
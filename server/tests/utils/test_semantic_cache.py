@@ -0,0 +1,52 @@
+from utils.semantic_cache import SemanticAnswerCache, content_fingerprint
+
+# Deterministic embeddings so the cache can be tested without calling OpenAI
+FAKE_EMBEDDINGS = {
+    "what is the sentiment?": [1.0, 0.0, 0.0],
+    "what's the sentiment?": [0.99, 0.1, 0.0],
+    "summarise the text": [0.0, 1.0, 0.0],
+}
+
+
+def fake_embedder(text):
+    return FAKE_EMBEDDINGS[text]
+
+
+def test_semantic_cache_hit_for_similar_question():
+    """
+    -- Test that a near-duplicate question on the same content hits the cache --
+    """
+    cache = SemanticAnswerCache(threshold=0.92, embedder=fake_embedder)
+    content_hash = content_fingerprint("Some file content")
+
+    cache.store(cache.embed("What is the sentiment?"), content_hash, ("Positive", []))
+
+    assert cache.lookup(cache.embed("What's   the sentiment?"), content_hash) == ("Positive", [])
+
+
+def test_semantic_cache_miss_for_different_question_or_content():
+    """
+    -- Test that dissimilar questions and different content never hit the cache --
+    """
+    cache = SemanticAnswerCache(threshold=0.92, embedder=fake_embedder)
+    content_hash = content_fingerprint("Some file content")
+    cache.store(cache.embed("What is the sentiment?"), content_hash, ("Positive", []))
+
+    assert cache.lookup(cache.embed("Summarise the text"), content_hash) is None
+    other_hash = content_fingerprint("Other file content")
+    assert cache.lookup(cache.embed("What is the sentiment?"), other_hash) is None
+
+
+def test_semantic_cache_evicts_when_full():
+    """
+    -- Test that the cache stays within max_entries --
+    """
+    cache = SemanticAnswerCache(threshold=0.92, max_entries=1, embedder=fake_embedder)
+    first_hash = content_fingerprint("first")
+    second_hash = content_fingerprint("second")
+
+    cache.store(cache.embed("What is the sentiment?"), first_hash, ("First", []))
+    cache.store(cache.embed("What is the sentiment?"), second_hash, ("Second", []))
+
+    assert cache.lookup(cache.embed("What is the sentiment?"), first_hash) is None
+    assert cache.lookup(cache.embed("What is the sentiment?"), second_hash) == ("Second", [])
@@ -1,6 +1,6 @@
 import pytest
 import logging
-from utils.text_analyzer import visualize_text
+from utils.text_analyzer import visualize_text, overall_sentiment
 
 logger = logging.getLogger(__name__)
 
@@ -119,4 +119,15 @@ async def test_visualize_text_irrelevant_input():
     assert isinstance(result["overview"],dict), "Overview should be a dictionary"
     assert isinstance(result["actors"], list), "Actors should be a list"
     assert len(result["actors"]) == 0
-    
\ No newline at end of file
+    
+
+
+def test_overall_sentiment_is_neutral_unless_one_side_clearly_wins():
+    """
+    -- Test that overall_sentiment only picks positive/negative when strictly highest --
+    """
+    assert overall_sentiment({"positive": 0.7, "negative": 0.1, "neutral": 0.2}) == "positive"
+    assert overall_sentiment({"positive": 0.1, "negative": 0.6, "neutral": 0.3}) == "negative"
+    assert overall_sentiment({"positive": 0.4, "negative": 0.4, "neutral": 0.2}) == "neutral"
+    assert overall_sentiment({"positive": 0.4, "negative": 0.2, "neutral": 0.4}) == "neutral"
+    assert overall_sentiment({}) == "neutral"